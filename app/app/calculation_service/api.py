@@ -1,27 +1,45 @@
+import itertools
 import math
+import os
 import pkg_resources
+import tempfile
 import traceback
 
 from pyglimmpse import unirep, multirep, samplesize
 from sentry_sdk import capture_exception
 
 import json, random
-from flask import Blueprint, Response, request
+from collections import OrderedDict
+from flask import Blueprint, Response, current_app, request, stream_with_context
 from flask_cors import cross_origin
 from pyglimmpse.exceptions.glimmpse_exception import GlimmpseValidationException
 from pyglimmpse.model.power import Power
 
-from app.calculation_service.model.enums import SolveFor, Tests, HypothesisType
+from app.calculation_service import executor, power_kernel, result_encoder, samplesize_sweep
+from app.calculation_service.power_curves import PowerCurveEvaluation
+from app.calculation_service.jobs import JobQueue, JobQueueFull, JobStore
+from app.calculation_service.result_cache import ResultCache
+from app.calculation_service.result_detail import MatrixTable, shape
+from app.calculation_service.model.enums import Detail, SolveFor, Tests, HypothesisType
 from app.calculation_service.model.linear_model import LinearModel
 from app.calculation_service.model.study_design import StudyDesign
 import numpy as np
 
 #from app.main import db
-from app.calculation_service.model.scenario_inputs import ScenarioInputs
+from app.calculation_service.model.scenario_inputs import ScenarioGrid, ScenarioInputs
+from app.calculation_service.utilities import as_matrix, fingerprint
 from app.constants import Constants
 
 bp = Blueprint('pyglimmpse', __name__, url_prefix='/api')
 
+# the fields of LinearModel.to_dict which echo a ScenarioInputs attribute
+_ECHOED_INPUTS = [('alpha', 'alpha'),
+                  ('target_power', 'target_power'),
+                  ('means_scale_factor', 'scale_factor'),
+                  ('variance_scale_factor', 'variance_scale_factor'),
+                  ('power_method', 'power_method'),
+                  ('quantile', 'quantile')]
+
 
 def jsonify_tex(texString):
     data = {'texString': texString}
@@ -57,91 +75,397 @@ def client_side_log():
 @bp.route('/calculate', methods=['POST'])
 @cross_origin()
 def calculate():
-    """Calculate power/samplesize from a study design"""
-    data = request.data
-    inputs = ScenarioInputs().load_from_json(data)
-    scenario = StudyDesign().load_from_json(data)
-    models = _generate_models(scenario, inputs)
-
-
-    results = []
-    for model in models:
-        try:
-            if model.errors:
-                print(model.errors)
-                result = dict(test=model.getTest(),
-                              samplesize=model.print_errors(),
-                              power=model.print_errors(),
-                              model=model.to_dict(),
-                              glimmpse_calc_version='0.0.23')
-            elif scenario.solve_for == SolveFor.POWER:
-                result = _calculate_power(model)
-            else:
-                result = _calculate_sample_size(model)
-        except GlimmpseValidationException as e:
-            capture_exception(e)
-            model.errors.add(e)
-            result = dict(test=model.test.value,
-                          samplesize=e.args[0],
-                          power=e.args[0],
-                          model=model.to_dict(),
-                          glimmpse_calc_version='0.0.23')
-        results.append(result)
+    """
+    Calculate power/samplesize from a study design.
+
+    The detail query parameter sets how much of the model of each result is returned: full (the default) returns
+    all of it, lean only its errors and the inputs identifying it, and shared returns each distinct matrix once, in
+    matrices, with the model referring to it by its position in matrices.
+    """
+    detail = _load_detail()
+    if detail is None:
+        return _unknown_detail()
+    scenario, inputs = _load_request(request.data)
+    table = MatrixTable()
+    results = [shape(result, detail, table) for result in _calculate_results(scenario, inputs)]
+
+    response = dict(status=200,
+                    mimetype='application/json',
+                    results=results)
+    if detail == Detail.SHARED:
+        response['matrices'] = table.matrices
+    json_response = result_encoder.dumps(response)
 
-    json_response = json.dumps(dict(status=200,
+    return json_response
+
+
+@bp.route('/calculate/stream', methods=['POST'])
+@cross_origin()
+def calculate_stream():
+    """
+    Calculate power/samplesize from a study design, streaming the results as newline delimited JSON.
+
+    Each line is {"index": i, "result": result} where i is the position of the result in the /calculate results
+    list. Lines are written as each result is calculated, so they are not in index order. With detail=shared, a line
+    also has {"matrices": {"id": matrix}} for each matrix its result refers to which no earlier line had.
+    """
+    detail = _load_detail()
+    if detail is None:
+        return _unknown_detail()
+    scenario, inputs = _load_request(request.data)
+    table = MatrixTable()
+
+    def generate():
+        for index, result in _iter_results(scenario, inputs):
+            known = len(table.matrices)
+            line = dict(index=index, result=shape(result, detail, table))
+            if len(table.matrices) > known:
+                line['matrices'] = {str(i): table.matrices[i] for i in range(known, len(table.matrices))}
+            yield result_encoder.dumps(line) + b'\n'
+
+    return Response(stream_with_context(generate()), status=200, mimetype='application/x-ndjson')
+
+
+@bp.route('/calculate/curve', methods=['POST'])
+@cross_origin()
+def calculate_curve():
+    """
+    Calculate every data series of the power curve of a study design along its x axis, returning each series as
+    arrays with one value per point. An adaptive curve is refined where it bends, and returns the points it was
+    evaluated at with an estimate of its interpolation error.
+    """
+    scenario, inputs = _load_request(request.data)
+    try:
+        curve = PowerCurveEvaluation(scenario, inputs)
+    except ValueError:
+        json_response = json.dumps(dict(status=400, mimetype='application/json', message='Unknown power curve x axis.'))
+        return Response(json_response, status=400, mimetype='application/json')
+    calculated = curve.evaluate(lambda inputs: _calculate_results(curve.study_design, inputs))
+
+    json_response = result_encoder.dumps(dict(status=200,
+                                              mimetype='application/json',
+                                              curve=calculated))
+    return json_response
+
+
+@bp.route('/jobs', methods=['POST'])
+@cross_origin()
+def submit_job():
+    """
+    Queue a power/samplesize calculation from a study design, returning the id of the job. Jobs are refused while
+    JOB_MAX_PENDING jobs are queued or running.
+    """
+    scenario, inputs = _load_request(request.data)
+    app = current_app._get_current_object()
+
+    def run(job):
+        with app.app_context():
+            for index, result in _iter_results(scenario, inputs):
+                job.add_result(index, result)
+
+    try:
+        job = get_job_queue().submit(run, len(inputs))
+    except JobQueueFull:
+        return _unavailable('Too many jobs are queued, please try again later.')
+    json_response = json.dumps(dict(status=202,
                                     mimetype='application/json',
-                                    results=results))
+                                    job_id=job.id))
+    return Response(json_response, status=202, mimetype='application/json')
 
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@cross_origin()
+def get_job(job_id):
+    """
+    Progress of a job, and the results calculated so far. Results not yet calculated are null. The detail query
+    parameter is as for /calculate.
+    """
+    detail = _load_detail()
+    if detail is None:
+        return _unknown_detail()
+    job_dict = get_job_queue().get(job_id)
+    if job_dict is None:
+        json_response = json.dumps(dict(status=404, mimetype='application/json', message='Unknown job.'))
+        return Response(json_response, status=404, mimetype='application/json')
+    table = MatrixTable()
+    job_dict['results'] = [shape(result, detail, table) for result in job_dict['results']]
+    if detail == Detail.SHARED:
+        job_dict['matrices'] = table.matrices
+    json_response = result_encoder.dumps(dict(status=200,
+                                              mimetype='application/json',
+                                              job=job_dict))
     return json_response
 
 
-def _generate_models(scenario: StudyDesign, inputs: []):
+@bp.route('/cache/stats', methods=['GET'])
+@cross_origin()
+def cache_stats():
+    """Hit, miss and eviction counts for the calculated result cache"""
+    json_response = json.dumps(dict(status=200,
+                                    mimetype='application/json',
+                                    stats=get_result_cache().stats()))
+    return json_response
+
+
+def _load_request(data):
+    """Decode a request body into its StudyDesign and the ScenarioGrid of its ScenarioInputs, parsing the JSON and
+    the IsuFactors once for both."""
+    d = json.loads(data)
+    scenario = StudyDesign().load_from_dict(d)
+    inputs = ScenarioInputs().grid_from_dict(d, scenario.isu_factors)
+    return scenario, inputs
+
+
+def _load_detail():
+    """The Detail of the detail query parameter, full if it is not given, or None if it is unknown."""
+    try:
+        return Detail(request.args.get('detail', Detail.FULL.value))
+    except ValueError:
+        return None
+
+
+def _unknown_detail():
+    json_response = json.dumps(dict(status=400, mimetype='application/json', message='Unknown detail.'))
+    return Response(json_response, status=400, mimetype='application/json')
+
+
+def _unavailable(message: str):
+    json_response = json.dumps(dict(status=503, mimetype='application/json', message=message))
+    return Response(json_response, status=503, mimetype='application/json')
+
+
+def get_result_cache() -> ResultCache:
+    """The result cache of the current application, created from its config on first use."""
+    if 'result_cache' not in current_app.extensions:
+        current_app.extensions['result_cache'] = ResultCache(max_size=current_app.config.get('RESULT_CACHE_SIZE', 1024),
+                                                             ttl=current_app.config.get('RESULT_CACHE_TTL', 3600))
+    return current_app.extensions['result_cache']
+
+
+def get_job_queue() -> JobQueue:
+    """
+    The job queue of the current application, created from its config on first use. Each process has its own queue,
+    and the jobs of all of them are kept in JOB_DIRECTORY.
+    """
+    if 'job_queue' not in current_app.extensions:
+        directory = current_app.config.get('JOB_DIRECTORY') or os.path.join(tempfile.gettempdir(), 'glimmpse-jobs')
+        current_app.extensions['job_queue'] = JobQueue(JobStore(directory),
+                                                       workers=current_app.config.get('JOB_WORKERS', 1),
+                                                       max_jobs=current_app.config.get('JOB_MAX_JOBS', 256),
+                                                       max_pending=current_app.config.get('JOB_MAX_PENDING', 64))
+    return current_app.extensions['job_queue']
+
+
+def _calculate_results(scenario: StudyDesign, inputs: []):
+    """Calculate the result for each set of inputs, in order."""
+    results = [None] * len(inputs)
+    for index, result in _iter_results(scenario, inputs):
+        results[index] = result
+    return results
+
+
+def _iter_results(scenario: StudyDesign, inputs):
+    """
+    Yield (index, result) for each set of inputs as soon as the result is available.
+
+    Inputs are first normalised to the values which affect the calculation, so each distinct calculation is done once
+    and its result is yielded for every set of inputs which normalises to it, with the inputs it echoes set back to
+    those of the row. Results are looked up in the result cache by the fingerprint of the design and normalised
+    inputs, and are yielded first. Models are only generated and evaluated for the calculations which are not found.
+    Results of calculations which went wrong unexpectedly are not cached, as they may not go wrong again.
+
+    The inputs are taken CALCULATION_CHUNK_SIZE at a time, and the models of a chunk are evaluated before the next
+    chunk is generated, so only one chunk of models is held at once. Calculations repeated in a later chunk are found
+    among the last REQUEST_RESULTS_SIZE results calculated for the request.
+
+    :param inputs: an iterable of ScenarioInputs, such as a ScenarioGrid
+    """
+    cache = get_result_cache()
+    orthonormalize_contrasts = get_orthonormalize_u_matrix(scenario, inputs)
+    design_fingerprint = scenario.fingerprint()
+    gaussian_covariate = scenario.gaussian_covariate is not None
+    precomputation = None
+    # the most recent results of this request by key, so that calculations repeated in a later chunk are not repeated
+    # even when the result cache is disabled or has dropped them. Bounded so that a request's results are not all held.
+    calculated = ResultCache(max_size=current_app.config.get('REQUEST_RESULTS_SIZE', 1024), ttl=math.inf)
+    for chunk in _chunks(enumerate(inputs), current_app.config.get('CALCULATION_CHUNK_SIZE', 256)):
+        planned = OrderedDict()
+        rows = OrderedDict()
+        for index, input in chunk:
+            normalised = input.normalised(gaussian_covariate)
+            key = fingerprint(design_fingerprint, normalised.fingerprint(), orthonormalize_contrasts)
+            planned.setdefault(key, normalised)
+            rows.setdefault(key, []).append((index, input))
+        missing = []
+        for key, row_inputs in rows.items():
+            result = calculated.get(key)
+            if result is None:
+                result = cache.get(key)
+                if result is not None:
+                    calculated.set(key, result)
+            if result is None:
+                missing.append(key)
+            else:
+                for index, input in row_inputs:
+                    yield index, _for_inputs(result, input, planned[key])
+        if not missing:
+            continue
+        if precomputation is None:
+            precomputation = LinearModel.precompute_design(scenario, orthonormalize_contrasts)
+        missing_inputs = [planned[key] for key in missing]
+        models = _generate_models(scenario, missing_inputs, orthonormalize_contrasts, precomputation)
+        processes = executor.get_processes(current_app.config.get('CALCULATION_PROCESSES', 1))
+        groups = _group_models(scenario, missing_inputs, range(len(missing)), models, processes)
+        evaluated = executor.iter_models(_calculate_group,
+                                         [[model for position, model in group] for group in groups],
+                                         processes=processes,
+                                         solve_for=scenario.solve_for)
+        for group_index, results in evaluated:
+            for (position, model), result in zip(groups[group_index], results):
+                key = missing[position]
+                calculated.set(key, result)
+                if _cacheable(result):
+                    cache.set(key, result)
+                for index, input in rows[key]:
+                    yield index, _for_inputs(result, input, planned[key])
+
+
+def _for_inputs(result, inputs: ScenarioInputs, normalised: ScenarioInputs):
+    """
+    A result calculated for normalised inputs as returned for inputs. The inputs echoed in its model which were
+    changed by normalising are set back to those of inputs, in a copy, as the result is shared by every row which
+    normalises to the same inputs and by the result cache.
+    """
+    changed = {field: getattr(inputs, name) for field, name in _ECHOED_INPUTS
+               if getattr(inputs, name) != getattr(normalised, name)}
+    if not changed or not isinstance(result.get('model'), dict):
+        return result
+    result = dict(result)
+    result['model'] = dict(result['model'], **changed)
+    return result
+
+
+def _cacheable(result) -> bool:
+    """Whether a result was calculated, or failed validation in a way that will not change if it is recalculated."""
+    errors = result.get('model', {}).get('errors') or []
+    return Constants.ERR_UNEXPECTED.value not in errors and [Constants.ERR_UNEXPECTED.value] not in errors
+
+
+def _chunks(iterable, size: int):
+    """Lists of up to size consecutive items of iterable."""
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, max(size, 1)))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, max(size, 1)))
+
+
+def _group_models(scenario: StudyDesign, inputs: [], indices: [], models: [], processes: int = 1) -> []:
+    """
+    Group (index, model) pairs which can be calculated together. When solving for samplesize, models whose inputs
+    differ only in their target power are grouped so that their samplesizes are found in one search. When solving
+    for power, the models whose power can be calculated in a batch are grouped whatever their test, so that the
+    tests share the eigenvalues of each model. These are split into a batch for each of the processes, the models
+    with the same N, scale factor and variance scale factor, and so the same eigenvalues, being kept in one batch.
+    The other models are grouped by test.
+    """
+    groups = OrderedDict()
+    batches = {}
+    for input, index, model in zip(inputs, indices, models):
+        if scenario.solve_for == SolveFor.SAMPLESIZE:
+            key = fingerprint({name: value for name, value in vars(input).items() if name != 'target_power'})
+        elif not model.errors and power_kernel.supports(_get_test(model), **_optional_args(model)):
+            spectra = (input.smallest_group_size, input.scale_factor, input.variance_scale_factor)
+            key = (None, batches.setdefault(spectra, len(batches) % processes))
+        else:
+            key = input.test
+        groups.setdefault(key, []).append((index, model))
+    return list(groups.values())
+
+
+def _calculate_group(models: [], solve_for):
+    """
+    Calculate power/samplesize for a group of models from _group_models. Module level so that it can be run in a
+    worker process.
+    """
+    sizes = [None] * len(models)
+    powers = [None] * len(models)
+    if solve_for == SolveFor.SAMPLESIZE and len(models) > 1:
+        sizes = _samplesize_sweep(models)
+    if solve_for == SolveFor.POWER and len(models) > 1:
+        powers = _power_batch(models)
+    return [_calculate(model, solve_for, size, power) for model, size, power in zip(models, sizes, powers)]
+
+
+def _calculate(model, solve_for, size=None, power=None):
+    """
+    Calculate power/samplesize for a single model. Module level so that it can be run in a worker process.
+
+    :param size: the result of a samplesize_sweep for this model, if there was one
+    :param power: the result of a power_batch for this model, if there was one
+    """
+    try:
+        if model.errors:
+            print(model.errors)
+            result = dict(test=model.getTest(),
+                          samplesize=model.print_errors(),
+                          power=model.print_errors(),
+                          model=model.to_dict(),
+                          glimmpse_calc_version='0.0.23')
+        elif solve_for == SolveFor.POWER:
+            result = _calculate_power(model, power)
+        else:
+            result = _calculate_sample_size(model, size)
+    except GlimmpseValidationException as e:
+        capture_exception(e)
+        model.errors.add(e)
+        result = dict(test=model.test.value,
+                      samplesize=e.args[0],
+                      power=e.args[0],
+                      model=model.to_dict(),
+                      glimmpse_calc_version='0.0.23')
+    return result
+
+
+def _generate_models(scenario: StudyDesign, inputs: [], orthonormalize_contrasts: bool = None, precomputation=None):
     """ Create a LinearModel object for each distinct set of parameters defined in the scenario"""
     models = []
-    orthonormalize_contrasts = get_orthonormalize_u_matrix(scenario, inputs)
+    if orthonormalize_contrasts is None:
+        orthonormalize_contrasts = get_orthonormalize_u_matrix(scenario, inputs)
+    if precomputation is None:
+        precomputation = LinearModel.precompute_design(scenario, orthonormalize_contrasts)
     for inputSet in inputs:
             model = LinearModel()
-            model.from_study_design(scenario, inputSet, orthonormalize_contrasts)
+            model.from_study_design(scenario, inputSet, orthonormalize_contrasts, precomputation)
             models.append(model)
     return models
 
 
-def _calculate_sample_size(model):
-    size = None
-    if model.errors:
-        pass
-    elif np.linalg.matrix_rank(model.u_matrix) == 1:  # B=1
-        test = multirep.special
-    elif (np.linalg.matrix_rank(model.u_matrix) > 1) & (np.linalg.matrix_rank(model.c_matrix) == 1) & (model.test in [Tests.HOTELLING_LAWLEY, Tests.PILLAI_BARTLET, Tests.WILKS_LIKLIEHOOD]):
-        test = multirep.special
-    elif model.test == Tests.HOTELLING_LAWLEY:
-        test = multirep.hlt_two_moment_null_approximator_obrien_shieh
-    elif model.test == Tests.PILLAI_BARTLET:
-        test = multirep.pbt_two_moment_null_approx_obrien_shieh
-    elif model.test == Tests.WILKS_LIKLIEHOOD:
-        test = multirep.wlk_two_moment_null_approx_obrien_shieh
-    elif model.test == Tests.BOX_CORRECTION:
-        test = unirep.box
-    elif model.test == Tests.GEISSER_GREENHOUSE:
-        test = unirep.geisser_greenhouse
-    elif model.test == Tests.HUYNH_FELDT:
-        test = unirep.hyuhn_feldt
-    elif model.test == Tests.UNCORRECTED:
-        test = unirep.uncorrected
-    size, power = _samplesize(test=test, model=model)
+def _calculate_sample_size(model, size=None):
+    size, power = _samplesize(test=_get_test(model), model=model, size=size)
     result = _samplesize_to_dict(model=model,
                                  size=size,
                                  power=power)
     return result
 
 
-def _calculate_power(model):
-    power = None
+def _calculate_power(model, power=None):
+    if isinstance(power, GlimmpseValidationException):
+        raise power
+    if power is None:
+        power = _power(test=_get_test(model), model=model)
+    result = _power_to_dict(model=model, power=power)
+    return result
+
+
+def _get_test(model):
+    """The pyglimmpse power function for the test of a model"""
+    test = None
     if model.errors:
         pass
-    elif np.linalg.matrix_rank(model.u_matrix) == 1:  # B=1
+    elif model.get_rank_u() == 1:  # B=1
         test = multirep.special
-    elif (np.linalg.matrix_rank(model.u_matrix) > 1) & (np.linalg.matrix_rank(model.c_matrix) == 1) & (model.test in [Tests.HOTELLING_LAWLEY, Tests.PILLAI_BARTLET, Tests.WILKS_LIKLIEHOOD]):
+    elif (model.get_rank_u() > 1) & (model.get_rank_c() == 1) & (model.test in [Tests.HOTELLING_LAWLEY, Tests.PILLAI_BARTLET, Tests.WILKS_LIKLIEHOOD]):
         test = multirep.special
     elif model.test == Tests.HOTELLING_LAWLEY:
         test = multirep.hlt_two_moment_null_approximator_obrien_shieh
@@ -157,30 +481,47 @@ def _calculate_power(model):
         test = unirep.hyuhn_feldt
     elif model.test == Tests.UNCORRECTED:
         test = unirep.uncorrected
-    power = _power(test=test, model=model)
-    result = _power_to_dict(model=model, power=power)
-    return result
+    return test
 
 
-def _samplesize(test, model, **kwargs):
+def _optional_args(model, **kwargs):
     if model.noncentrality_distribution:
         kwargs['noncentrality_distribution'] = model.noncentrality_distribution
     if model.quantile:
         kwargs['quantile'] = model.quantile
     if model.confidence_interval:
         kwargs['confidence_interval'] = model.confidence_interval
-    kwargs['tolerance'] = 1e-12
+    return kwargs
+
+
+def _get_target_power(model):
     if model.target_power >=1:
         model.target_power = 0.999999
+    return model.target_power
+
+
+def _samplesize(test, model, size=None, **kwargs):
+    """
+    Smallest realizable samplesize and its power for a model.
+
+    :param size: the result of a samplesize_sweep for this model, if there was one: (size, power) or a ValueError
+    """
+    kwargs = _optional_args(model, **kwargs)
+    kwargs['tolerance'] = 1e-12
+    target_power = _get_target_power(model)
+    if size is not None:
+        if isinstance(size, ValueError):
+            raise GlimmpseValidationException(size.args[0])
+        return size
     try:
         size, power = samplesize.samplesize(test=test,
-                                            rank_C=np.linalg.matrix_rank(model.c_matrix),
+                                            rank_C=model.get_rank_c(),
                                             rank_X=model.get_rank_x(),
                                             relative_group_sizes=model.groups,
                                             alpha=model.alpha,
-                                            sigma_star=model.sigma_star,
-                                            delta_es=model.delta,
-                                            targetPower=model.target_power,
+                                            sigma_star=as_matrix(model.sigma_star),
+                                            delta_es=as_matrix(model.delta),
+                                            targetPower=target_power,
                                             starting_smallest_group_size=model.minimum_smallest_group_size,
                                             **kwargs)
     except ValueError as e:
@@ -188,16 +529,77 @@ def _samplesize(test, model, **kwargs):
     return size, power
 
 
+def _samplesize_sweep(models: []) -> []:
+    """
+    Search for the samplesizes of models which differ only in their target power together, so that power is
+    evaluated once for each N.
+
+    :return: for each model, (size, power) or a ValueError. None if the model should be searched for on its own.
+    """
+    model = models[0]
+    if model.errors:
+        return [None] * len(models)
+    try:
+        return samplesize_sweep.samplesizes(test=_get_test(model),
+                                            rank_C=model.get_rank_c(),
+                                            rank_X=model.get_rank_x(),
+                                            relative_group_sizes=model.groups,
+                                            alpha=model.alpha,
+                                            sigma_star=as_matrix(model.sigma_star),
+                                            delta_es=as_matrix(model.delta),
+                                            target_powers=[_get_target_power(m) for m in models],
+                                            starting_smallest_group_size=model.minimum_smallest_group_size,
+                                            tolerance=1e-12,
+                                            **_optional_args(model))
+    except (ValueError, GlimmpseValidationException):
+        # searching for each model on its own reports the error in the same way as for a single model
+        return [None] * len(models)
+
+
+def _power_batch(models: []) -> []:
+    """
+    Calculate power for models of one design together, in a batch. The models may have different tests.
+
+    :return: for each model, a Power or the GlimmpseValidationException raised calculating it. None if the model
+             should be calculated on its own.
+    """
+    batch = [model for model in models
+             if not model.errors and model.sigma_star is not None and model.delta is not None]
+    if len(batch) < 2:
+        return [None] * len(models)
+    model = batch[0]
+    same_design = all(m.get_rank_c() == model.get_rank_c()
+                      and m.get_rank_x() == model.get_rank_x()
+                      and m.groups == model.groups
+                      and m.sigma_star.shape == model.sigma_star.shape
+                      and m.delta.shape == model.delta.shape
+                      and power_kernel.supports(_get_test(m), **_optional_args(m)) for m in batch)
+    if not same_design:
+        return [None] * len(models)
+    powers = power_kernel.powers(test=[_get_test(m) for m in batch],
+                                 rank_C=model.get_rank_c(),
+                                 rank_X=model.get_rank_x(),
+                                 relative_group_sizes=model.groups,
+                                 rep_N=[m.smallest_group_size for m in batch],
+                                 alpha=[m.alpha for m in batch],
+                                 sigma_star=np.stack([m.sigma_star for m in batch]),
+                                 delta_es=np.stack([m.delta for m in batch]),
+                                 sigma_star_factor=np.stack([m.get_sigma_star_factor() for m in batch]))
+    calculated = {id(m): power for m, power in zip(batch, powers)}
+    return [calculated.get(id(m)) for m in models]
+
+
 def _samplesize_to_dict(model, size, power):
+    """As _power_to_dict, a power or bound which is not a number is reported as -1."""
     pow = 'Not Calculated.'
     lower = None
     upper = None
     if power:
-        pow = power.power
+        pow = result_encoder.finite(power.power)
         if power.lower_bound and power.lower_bound.power:
-            lower = power.lower_bound.power
+            lower = result_encoder.finite(power.lower_bound.power)
         if power.upper_bound and power.upper_bound.power:
-            upper = power.upper_bound.power
+            upper = result_encoder.finite(power.upper_bound.power)
     return dict(test=model.test.value,
                 samplesize=size,
                 power=pow,
@@ -207,20 +609,15 @@ def _samplesize_to_dict(model, size, power):
 
 
 def _power(test, model, **kwargs):
-    if model.noncentrality_distribution:
-        kwargs['noncentrality_distribution'] = model.noncentrality_distribution
-    if model.quantile:
-        kwargs['quantile'] = model.quantile
-    if model.confidence_interval:
-        kwargs['confidence_interval'] = model.confidence_interval
+    kwargs = _optional_args(model, **kwargs)
 
-    power = test(rank_C=np.linalg.matrix_rank(model.c_matrix),
+    power = test(rank_C=model.get_rank_c(),
                  rank_X=model.get_rank_x(),
                  rep_N=model.smallest_group_size,
                  relative_group_sizes=model.groups,
                  alpha=model.alpha,
-                 sigma_star=model.sigma_star,
-                 delta_es=model.delta,
+                 sigma_star=as_matrix(model.sigma_star),
+                 delta_es=as_matrix(model.delta),
                  **kwargs)
     return power
 
@@ -234,16 +631,12 @@ def _power_to_dict(model, power):
         if type(pow) is tuple:
             pow = 1 - pow[0]
         if math.isnan(pow):
-            pow = -1
             model.errors.add(Constants.ERR_ERROR_DEG_FREEDOM)
+        pow = result_encoder.finite(pow)
         if power.lower_bound and power.lower_bound.power:
-            lower = power.lower_bound.power
-            if math.isnan(lower):
-                lower = -1
+            lower = result_encoder.finite(power.lower_bound.power)
         if power.upper_bound and power.upper_bound.power:
-            upper = power.upper_bound.power
-            if math.isnan(upper):
-                upper = -1
+            upper = result_encoder.finite(power.upper_bound.power)
     result = dict(test=model.test.value,
                   power=pow,
                   lower_bound=lower,
@@ -252,9 +645,11 @@ def _power_to_dict(model, power):
     return result
 
 def get_orthonormalize_u_matrix(study_design: StudyDesign, inputs):
+    """:param inputs: a list of ScenarioInputs, or a ScenarioGrid, whose tests axis is read without expanding it"""
     orthonormalize_u_matrix = False
     if study_design.isu_factors.uMatrix.hypothesis_type != HypothesisType.POLYNOMIAL.value:
-        for input in inputs:
-            if input.test in [Tests.BOX_CORRECTION, Tests.HUYNH_FELDT, Tests.GEISSER_GREENHOUSE, Tests.HUYNH_FELDT, Tests.UNCORRECTED]:
+        tests = inputs.tests if isinstance(inputs, ScenarioGrid) else [input.test for input in inputs]
+        for test in tests:
+            if test in [Tests.BOX_CORRECTION, Tests.HUYNH_FELDT, Tests.GEISSER_GREENHOUSE, Tests.HUYNH_FELDT, Tests.UNCORRECTED]:
                 orthonormalize_u_matrix = True
     return orthonormalize_u_matrix
\ No newline at end of file
@@ -0,0 +1,63 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+_pool = None
+_pool_processes = None
+_pool_lock = threading.Lock()
+
+
+def get_processes(processes):
+    """Number of worker processes to use. None or values below 1 mean one worker per CPU."""
+    if processes is None or processes < 1:
+        return os.cpu_count() or 1
+    return processes
+
+
+def get_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Return the process pool shared by all requests handled by this process.
+
+    The pool is created lazily so that it is started after uWSGI has forked its workers. Request and job threads
+    may ask for it at the same time, so it is only checked and replaced while holding a lock.
+    """
+    global _pool, _pool_processes
+    with _pool_lock:
+        if _pool is None or _pool_processes != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=processes)
+            _pool_processes = processes
+        return _pool
+
+
+def iter_models(function, models: [], processes: int = 1, **kwargs):
+    """
+    Apply function to each model, yielding (index, result) pairs as soon as each result is available.
+
+    Results from a pool are yielded in the order they complete, so the index of the model in models is given with
+    each result. Models are sent to the workers in chunks, about four per worker.
+
+    :param function: a module level function taking a LinearModel as its first argument
+    :param models: the LinearModels to evaluate
+    :param processes: number of worker processes. 1 evaluates the models serially in this process.
+    :param kwargs: further keyword arguments passed to function
+    """
+    processes = get_processes(processes)
+    if processes == 1 or len(models) < 2:
+        for index, model in enumerate(models):
+            yield index, function(model, **kwargs)
+        return
+    pool = get_pool(processes)
+    chunksize = max(1, len(models) // (processes * 4))
+    futures = {pool.submit(_apply_chunk, function, models[start:start + chunksize], kwargs): start
+               for start in range(0, len(models), chunksize)}
+    for future in as_completed(futures):
+        start = futures[future]
+        for offset, result in enumerate(future.result()):
+            yield start + offset, result
+
+
+def _apply_chunk(function, models: [], kwargs: dict) -> []:
+    return [function(model, **kwargs) for model in models]
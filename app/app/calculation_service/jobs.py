@@ -0,0 +1,208 @@
+import json
+import os
+import re
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.calculation_service import result_encoder
+from app.calculation_service.model.enums import JobStatus
+
+_JOB_ID = re.compile('[0-9a-f]{32}')
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue already has its maximum number of unfinished jobs."""
+
+
+class JobStore(object):
+    """
+    Jobs and their results as files in a directory, so that every process serving requests can read a job, whichever
+    process is running it.
+
+    Each job has a status file, <id>.json, replaced whole when its status changes, and a results file, <id>.results,
+    to which each result is appended as a line of JSON [index, result] as it is calculated. A job which is not
+    finished but whose process on this host has stopped is reported as failed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, job: 'Job'):
+        """Write the status of job, replacing the file at once so that it is never read half written."""
+        status = dict(id=job.id,
+                      status=job.status.value,
+                      total=job.total,
+                      error=job.error,
+                      created=job.created,
+                      finished=job.finished,
+                      host=socket.gethostname(),
+                      pid=os.getpid())
+        path = self._path(job.id, '.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(status, f)
+        os.replace(path + '.tmp', path)
+
+    def add_result(self, job_id: str, index: int, result):
+        with open(self._path(job_id, '.results'), 'ab') as f:
+            f.write(result_encoder.dumps([index, result]) + b'\n')
+
+    def load(self, job_id: str) -> dict:
+        """The job with id job_id, as Job.to_dict, or None if there is no such job."""
+        status = self._status(job_id)
+        if status is None:
+            return None
+        results = [None] * status['total']
+        completed = 0
+        try:
+            with open(self._path(job_id, '.results'), 'rb') as f:
+                for line in f:
+                    try:
+                        index, result = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        # the last line may still be being written
+                        continue
+                    results[index] = result
+                    completed += 1
+        except FileNotFoundError:
+            pass
+        return dict(id=status['id'],
+                    status=status['status'],
+                    total=status['total'],
+                    completed=completed,
+                    error=status['error'],
+                    results=results)
+
+    def pending(self) -> int:
+        """Number of jobs which are queued or running."""
+        return sum(1 for status in self._statuses() if status['finished'] is None)
+
+    def drop_finished(self, max_jobs: int):
+        """Delete the oldest finished jobs until there are at most max_jobs jobs."""
+        statuses = sorted(self._statuses(), key=lambda status: status['created'])
+        excess = len(statuses) - max_jobs
+        for status in [status for status in statuses if status['finished'] is not None][:max(excess, 0)]:
+            for extension in ('.json', '.results'):
+                try:
+                    os.remove(self._path(status['id'], extension))
+                except FileNotFoundError:
+                    pass
+
+    def _statuses(self) -> []:
+        ids = [name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json')]
+        return [status for status in map(self._status, ids) if status is not None]
+
+    def _status(self, job_id: str) -> dict:
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id, '.json')) as f:
+                status = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if status['finished'] is None and status['host'] == socket.gethostname() and not _running(status['pid']):
+            status.update(status=JobStatus.FAILED.value,
+                          error='The server stopped while running the job.',
+                          finished=status['created'])
+        return status
+
+    def _path(self, job_id: str, extension: str) -> str:
+        return os.path.join(self.directory, job_id + extension)
+
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Job(object):
+    """A calculation running in the background. Its results are written to a JobStore as they are calculated."""
+
+    def __init__(self, total: int, store: JobStore):
+        self.id = uuid.uuid4().hex
+        self.status = JobStatus.QUEUED
+        self.total = total
+        self.completed = 0
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._store = store
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def add_result(self, index: int, result):
+        with self._lock:
+            self._store.add_result(self.id, index, result)
+            self.completed += 1
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until the job has finished or failed, returning False if it has not after timeout seconds."""
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return self._store.load(self.id)
+
+
+class JobQueue(object):
+    """
+    Job queue of one process. Jobs are run in submission order by a pool of worker threads, and kept in a JobStore
+    shared by every process, so a job can be fetched from any of them.
+
+    At most max_pending jobs of all processes may be queued or running at once. Finished jobs are kept so that their
+    results can be fetched, up to max_jobs jobs in total, the oldest finished jobs being dropped first.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 1, max_jobs: int = 256, max_pending: int = 64):
+        self.store = store
+        self.max_jobs = max_jobs
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(self, function, total: int) -> Job:
+        """
+        Queue function(job) to be run by a worker.
+
+        :param function: called with the Job, should call job.add_result for each result as it is calculated
+        :param total: number of results the job will produce
+        :return: the queued Job
+        :raises JobQueueFull: if max_pending jobs are already queued or running
+        """
+        if self.store.pending() >= self.max_pending:
+            raise JobQueueFull()
+        job = Job(total, self.store)
+        self.store.save(job)
+        self.store.drop_finished(self.max_jobs)
+        self._executor.submit(self._run, function, job)
+        return job
+
+    def get(self, job_id: str) -> dict:
+        """The job with id job_id as Job.to_dict, whichever process is running it, or None if there is no such job."""
+        return self.store.load(job_id)
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs, waiting for the queued and running jobs to finish if wait is True."""
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, function, job: Job):
+        job.status = JobStatus.RUNNING
+        self.store.save(job)
+        try:
+            function(job)
+            job.status = JobStatus.FINISHED
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = JobStatus.FAILED
+        job.finished = time.time()
+        self.store.save(job)
+        job._done.set()
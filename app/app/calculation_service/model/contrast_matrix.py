@@ -6,7 +6,7 @@ class ContrastMatrix(object):
 
     def __init_(self,
                 hypothesis_type: str = None,
-                values: np.matrix = None):
+                values: np.ndarray = None):
         self.hypothesis_type = hypothesis_type
         self.values = values
 
@@ -14,4 +14,4 @@ class ContrastMatrix(object):
         if source['_type']:
             self.hypothesis_type =  source['_type']
         if source['_values'] and source['_values']['data']:
-            self.values =  np.matrix(source['_values']['data'])
\ No newline at end of file
+            self.values =  np.array(source['_values']['data'], ndmin=2)
\ No newline at end of file
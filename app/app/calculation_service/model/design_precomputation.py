@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class DesignPrecomputation(object):
+    """
+    The parts of a LinearModel which depend only on the StudyDesign, not on the ScenarioInputs.
+
+    These are built once per request by LinearModel.precompute_design and shared by every model in the request.
+    Each model then applies only the parts which vary between ScenarioInputs (scale factors, N and test).
+    """
+
+    def __init__(self,
+                 full_beta: bool = False,
+                 orthonormalize_u_matrix: bool = False,
+                 essence_design_matrix: np.ndarray = None,
+                 groups: [] = None,
+                 hypothesis_beta: np.ndarray = None,
+                 c_matrix: np.ndarray = None,
+                 u_matrix: np.ndarray = None,
+                 sigma_star_outcome_component: np.ndarray = None,
+                 sigma_star_repeated_measure_component: np.ndarray = None,
+                 sigma_star_cluster_component: float = None,
+                 sigma_star_gaussian_adjustment: np.ndarray = None,
+                 unadjusted_sigma_star: np.ndarray = None,
+                 theta_zero: np.ndarray = None):
+        """
+        Parameters
+        ----------
+        hypothesis_beta
+            BETA before it is multiplied by the means scale factor
+        sigma_star_outcome_component
+            the outcome component of sigma star before it is multiplied by the variance scale factor
+        unadjusted_sigma_star
+            sigma star before it is multiplied by the variance scale factor and the gaussian adjustment is removed
+        """
+        self.full_beta = full_beta
+        self.orthonormalize_u_matrix = orthonormalize_u_matrix
+        self.essence_design_matrix = essence_design_matrix
+        self.groups = groups
+        self.hypothesis_beta = hypothesis_beta
+        self.c_matrix = c_matrix
+        self.u_matrix = u_matrix
+        self.sigma_star_outcome_component = sigma_star_outcome_component
+        self.sigma_star_repeated_measure_component = sigma_star_repeated_measure_component
+        self.sigma_star_cluster_component = sigma_star_cluster_component
+        self.sigma_star_gaussian_adjustment = sigma_star_gaussian_adjustment
+        self.unadjusted_sigma_star = unadjusted_sigma_star
+        self.theta_zero = theta_zero
+        # cached LinearModel facts (ranks and singular values) of essence_design_matrix, c_matrix and u_matrix
+        self.facts = dict()
+        # theta, M and delta before scaling by the means scale factor. Only calculated, and scalable only True, when
+        # theta zero is zero, so that theta and delta scale with the means scale factor.
+        self.scalable = False
+        self.theta = None
+        self.m = None
+        self.m_factor = None
+        self.m_is_singular = None
+        self.delta = None
+        # errors found while building the design. complete is False if building stopped at an exception.
+        self.errors = set([])
+        self.complete = False
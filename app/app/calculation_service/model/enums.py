@@ -32,6 +32,22 @@ class SolveFor(Enum):
     POWER = 'POWER'
     SAMPLESIZE = 'SAMPLESIZE'
 
+class XAxis(Enum):
+    DESIRED_POWER = 'DesiredPower'
+    TOTAL_SAMPLE_SIZE = 'TotalSampleSize'
+    MEAN_SCALE_FACTOR = 'MeanScaleFactor'
+
+class Detail(Enum):
+    LEAN = 'lean'
+    SHARED = 'shared'
+    FULL = 'full'
+
+class JobStatus(Enum):
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    FINISHED = 'FINISHED'
+    FAILED = 'FAILED'
+
 class ClType(Enum):
     CLTYPE_DESIRED = 1
     CLTYPE_NOT_DESIRED = 2
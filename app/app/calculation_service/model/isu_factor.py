@@ -49,4 +49,4 @@ class IsuFactor(object):
         if source.get('child'):
             self.child = source['child']
         if source.get('partialMatrix'):
-            self.partial_matrix = np.matrix(source['partialMatrix']['_values']['data'])
+            self.partial_matrix = np.array(source['partialMatrix']['_values']['data'], ndmin=2)
@@ -1,4 +1,5 @@
 import numpy as np
+from pyglimmpse.exceptions.glimmpse_exception import GlimmpseValidationException
 
 from app.calculation_service.model.cluster import Cluster
 from app.calculation_service.model.enums import IsuFactorType
@@ -41,7 +42,7 @@ class OutcomeRepeatedMeasureStDev(object):
         if source['repMeasure']:
             self.repeated_measure = source['repMeasure']
         if source['values']:
-            self.values = np.matrix(source['values'])
+            self.values = np.array(source['values'], ndmin=2)
 
 class IsuFactors(object):
     """
@@ -63,7 +64,16 @@ class IsuFactors(object):
                  cMatrix: ContrastMatrix = None,
                  uMatrix: ContrastMatrix = None,
                  full_beta: bool = False,
+                 marginal_means_array: np.ndarray = None,
+                 between_isu_relative_group_sizes_array: np.ndarray = None,
                  **kwargs):
+        """
+        marginal_means and between_isu_relative_group_sizes are lists of tables of cells, as sent by the front end.
+        Alternatively, the compact input format sends them as dense arrays, which are stored in
+        marginal_means_array (BETA, between ISU cells by outcome and repeated measure cells) and
+        between_isu_relative_group_sizes_array (one axis per predictor). The relative group sizes are always held
+        as an array, built from the tables if they are sent in the original format.
+        """
         self.variables = variables
         self.between_isu_relative_group_sizes = between_isu_relative_group_sizes
         self.marginal_means = marginal_means
@@ -74,6 +84,8 @@ class IsuFactors(object):
         self.cMatrix = cMatrix
         self.uMatrix = uMatrix
         self.full_beta = full_beta
+        self.marginal_means_array = marginal_means_array
+        self.between_isu_relative_group_sizes_array = between_isu_relative_group_sizes_array
 
         if kwargs.get('source'):
             self.from_dict(kwargs['source'])
@@ -85,6 +97,8 @@ class IsuFactors(object):
                 comp.append(False)
             if key == 'variables':
                 comp.append(list_compare(self.variables, other.variables))
+            elif key in ['marginal_means_array', 'between_isu_relative_group_sizes_array']:
+                comp.append(np.array_equal(self.__dict__[key], other.__dict__[key]))
             elif key == 'outcome_correlation_matrix':
                 comp.append(np.array_equal(self.outcome_correlation_matrix.data, other.outcome_correlation_matrix.data))
             else:
@@ -113,11 +127,11 @@ class IsuFactors(object):
         if source.get('smallestGroupSize'):
             self.smallest_group_size = source['smallestGroupSize']
         if source.get('theta0'):
-            self.theta0 = np.matrix(source['theta0'])
+            self.theta0 = np.array(source['theta0'], ndmin=2)
         if (source.get('outcomeCorrelationMatrix')
                 and source['outcomeCorrelationMatrix'].get('_values')
                 and source['outcomeCorrelationMatrix']['_values'].get('data')):
-            self.outcome_correlation_matrix = np.matrix(source['outcomeCorrelationMatrix']['_values']['data'])
+            self.outcome_correlation_matrix = np.array(source['outcomeCorrelationMatrix']['_values']['data'], ndmin=2)
         if source.get('outcomeRepeatedMeasureStDevs'):
             self.outcome_repeated_measure_st_devs = \
                 [OutcomeRepeatedMeasureStDev(source=stdev) for stdev in source['outcomeRepeatedMeasureStDevs']]
@@ -127,6 +141,77 @@ class IsuFactors(object):
         if source.get('uMatrix'):
             self.uMatrix = ContrastMatrix()
             self.uMatrix.from_dict(source.get('uMatrix'))
+        if source.get('marginalMeansArray'):
+            self.marginal_means_array = self.parse_marginal_means_array(source['marginalMeansArray'])
+        if source.get('betweenIsuRelativeGroupSizesArray'):
+            self.between_isu_relative_group_sizes_array = \
+                self.parse_group_sizes_array(source['betweenIsuRelativeGroupSizesArray'])
+        elif self.between_isu_relative_group_sizes and self.variables:
+            self.between_isu_relative_group_sizes_array = \
+                self.parse_group_size_tables(self.between_isu_relative_group_sizes)
+
+    def parse_group_size_tables(self, tables):
+        """
+        Relative group sizes as an array with one axis per predictor, in the order of the predictors, built from
+        tables of cells. Each cell is placed by the levels in its id. None if a cell's id does not name a level of
+        every predictor.
+        """
+        predictors = self.get_predictors()
+        if len(predictors) == 0:
+            return None
+        cells = [cell for table in tables for row in table.get('_table') for cell in row]
+        shape = tuple(len(p.values) for p in predictors)
+        values = np.zeros(shape, dtype=int if all(type(c.get('value')) is int for c in cells) else float)
+        level_indices = [{str(level): i for i, level in enumerate(p.values)} for p in predictors]
+        for cell in cells:
+            levels = {str(i.get('factorName')): str(i.get('value')) for i in cell.get('id')}
+            try:
+                index = tuple(indices[levels[p.name]] for p, indices in zip(predictors, level_indices))
+            except KeyError:
+                return None
+            values[index] = cell.get('value')
+        return values
+
+    def parse_marginal_means_array(self, source):
+        """
+        Parse marginal means sent in the compact format:
+
+            {"rows": [predictor names], "columns": [repeated measure names], "values": [[...], ...]}
+
+        values has one row per combination of the row factors' levels, and one column per outcome and combination of
+        the column factors' levels, the outcome varying slowest. Levels vary fastest along the last named factor.
+        """
+        values = np.array(source['values'], dtype=float)
+        rows = self._get_level_count(source.get('rows', []))
+        columns = len(self.get_outcomes()) * self._get_level_count(source.get('columns', []))
+        if values.shape != (rows, columns):
+            raise GlimmpseValidationException('Marginal means should have shape ({0}, {1}), not {2}.'
+                                              .format(rows, columns, values.shape))
+        return values
+
+    def parse_group_sizes_array(self, source):
+        """
+        Parse relative group sizes sent in the compact format:
+
+            {"axes": [predictor names], "values": nested lists with one axis per predictor}
+        """
+        values = np.array(source['values'])
+        if values.dtype.kind not in 'iuf':
+            values = values.astype(float)
+        shape = tuple(len(self._get_variable(name).values) for name in source.get('axes', []))
+        if values.shape != shape:
+            raise GlimmpseValidationException('Relative group sizes should have shape {0}, not {1}.'
+                                              .format(shape, values.shape))
+        return values
+
+    def _get_level_count(self, names):
+        return int(np.prod([len(self._get_variable(name).values) for name in names]))
+
+    def _get_variable(self, name):
+        for variable in self.variables:
+            if variable.name == name:
+                return variable
+        raise GlimmpseValidationException('Unknown factor {0}.'.format(name))
 
     def get_hypothesis(self):
         return [f for f in self.variables if f.in_hypothesis]
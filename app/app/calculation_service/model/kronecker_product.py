@@ -0,0 +1,54 @@
+import numpy as np
+
+from app.calculation_service.utilities import kronecker_list
+
+
+class KroneckerProduct(object):
+    """
+    A matrix A1 x A2 x ... x An (x the Kronecker product) stored as its factors.
+
+    By the mixed product property, (U1 x U2)' (A1 x A2) (U1 x U2) = (U1' A1 U1) x (U2' A2 U2), so congruence with a
+    Kronecker structured U can be done factor by factor without forming either dense matrix.
+    """
+
+    def __init__(self, factors: []):
+        """
+        :param factors: matrices or scalars. KroneckerProduct factors are expanded into their own factors.
+        """
+        self.factors = []
+        for factor in factors:
+            if isinstance(factor, KroneckerProduct):
+                self.factors.extend(factor.factors)
+            else:
+                self.factors.append(np.array(factor, ndmin=2))
+
+    @property
+    def shape(self):
+        return (int(np.prod([f.shape[0] for f in self.factors])),
+                int(np.prod([f.shape[1] for f in self.factors])))
+
+    def dense(self) -> np.ndarray:
+        return kronecker_list(self.factors)
+
+    def congruence(self, u) -> 'KroneckerProduct':
+        """
+        U' A U, where A is this matrix.
+
+        :param u: a KroneckerProduct whose factors can be multiplied factor by factor with the factors of this one.
+        :return: KroneckerProduct
+        """
+        factors = [f for f in self.factors if f.shape != (1, 1)]
+        scale = np.prod([f[0, 0] for f in self.factors if f.shape == (1, 1)])
+        u_factors = [f for f in u.factors if f.shape != (1, 1)]
+        u_scale = np.prod([f[0, 0] for f in u.factors if f.shape == (1, 1)])
+        if not self.conforms(u):
+            raise ValueError('U does not have the same Kronecker structure as A.')
+        products = [uf.T @ f @ uf for f, uf in zip(factors, u_factors)]
+        return KroneckerProduct([scale * u_scale ** 2] + products)
+
+    def conforms(self, u) -> bool:
+        """Whether U' A U can be calculated factor by factor. Scalar factors are ignored."""
+        factors = [f for f in self.factors if f.shape != (1, 1)]
+        u_factors = [f for f in u.factors if f.shape != (1, 1)]
+        return (len(factors) == len(u_factors)
+                and all(f.shape[0] == f.shape[1] == uf.shape[0] for f, uf in zip(factors, u_factors)))
@@ -1,46 +1,91 @@
 import json
+import math
 import traceback
 import warnings
 from json import JSONEncoder
 
 import numpy as np
+from scipy import linalg
 from pyglimmpse.exceptions.glimmpse_exception import GlimmpseValidationException, GlimmpseCalculationException
 from pyglimmpse import orpol
 
 from app.constants import Constants
 from app.calculation_service import utilities
 from app.calculation_service.model.enums import PolynomialMatrices, HypothesisType, Tests, SolveFor
+from app.calculation_service.model.design_precomputation import DesignPrecomputation
 from app.calculation_service.model.isu_factors import IsuFactors
+from app.calculation_service.model.kronecker_product import KroneckerProduct
 from app.calculation_service.model.study_design import StudyDesign
 from app.calculation_service.utilities import kronecker_list
 from app.calculation_service.model.scenario_inputs import ScenarioInputs
 from app.calculation_service.model.predictor import Predictor
 from app.calculation_service.model.gaussian_covariate import GaussianCovariate
 
-from itertools import groupby
-from operator import itemgetter
-
 from pyglimmpse.NonCentralityDistribution import NonCentralityDistribution
 
-from app.calculation_service.model.group_id import GroupId
+
+def _metadata(fact, calculate):
+    """
+    A property of LinearModel which is calculated by the method named calculate the first time it is asked for, and
+    cached as fact until something it depends on is set. Assigning to the property replaces the calculated value.
+    A calculation which raises is not cached, so it raises again each time the property is asked for.
+    """
+    def get(self):
+        if fact not in self._facts:
+            self._facts[fact] = getattr(self, calculate)()
+        return self._facts[fact]
+
+    def set(self, value):
+        self._facts[fact] = value
+
+    return property(get, set)
 
 
 class LinearModel(object):
     """class describing a GLMM"""
 
+    # Facts derived from a matrix (ranks, singular values etc.) and the model metadata (theta, M, delta etc.) are
+    # cached the first time they are asked for. Setting an attribute discards the facts which depend on it, and in
+    # turn the facts which depend on those.
+    _CACHE_DEPENDENCIES = {'essence_design_matrix': ['singular_values_x', 'rank_x', 'm'],
+                           'c_matrix': ['singular_values_c', 'rank_c', 'theta', 'm'],
+                           'u_matrix': ['singular_values_u', 'rank_u', 'theta'],
+                           'hypothesis_beta': ['theta'],
+                           'theta_zero': ['delta'],
+                           'theta': ['delta'],
+                           'm': ['m_factor', 'm_is_singular', 'delta'],
+                           'm_factor': ['delta'],
+                           'delta': ['hypothesis_sum_square'],
+                           'repeated_rows_in_design_matrix': ['hypothesis_sum_square'],
+                           'rank_x': ['nu_e'],
+                           'total_n': ['nu_e'],
+                           'nu_e': ['error_sum_square'],
+                           'sigma_star': ['sigma_star_factor', 'error_sum_square']}
+    # the facts which depend only on the design, and so can be shared through a DesignPrecomputation
+    _DESIGN_FACTS = ['singular_values_x', 'rank_x', 'singular_values_c', 'rank_c', 'singular_values_u', 'rank_u']
+
+    # a model is built for every set of ScenarioInputs, so its attributes are fixed rather than held in a __dict__
+    __slots__ = ('_facts', 'full_beta', 'essence_design_matrix', 'repeated_rows_in_design_matrix', 'hypothesis_beta',
+                 'c_matrix', 'u_matrix', 'sigma_star_outcome_component', 'sigma_star_repeated_measure_component',
+                 'sigma_star_cluster_component', 'sigma_star_gaussian_adjustment', 'sigma_star', 'u_matrix_factors',
+                 'sigma_star_repeated_measure_factors', 'theta_zero', 'alpha', 'total_n', 'errors', 'test',
+                 'target_power', 'smallest_group_size', 'scale_factor', 'variance_scale_factor',
+                 'minimum_smallest_group_size', 'groups', 'power_method', 'quantile', 'confidence_interval',
+                 'orthonormalize_u_matrix', 'noncentrality_distribution')
+
     def __init__(self,
                  full_beta: bool = False,
-                 essence_design_matrix: np.matrix = None,
+                 essence_design_matrix: np.ndarray = None,
                  repeated_rows_in_design_matrix: float = None,
-                 hypothesis_beta: np.matrix = None,
-                 c_matrix: np.matrix = None,
-                 u_matrix: np.matrix = None,
-                 sigma_star_outcome_component: np.matrix = None,
-                 sigma_star_repeated_measure_component: np.matrix = None,
+                 hypothesis_beta: np.ndarray = None,
+                 c_matrix: np.ndarray = None,
+                 u_matrix: np.ndarray = None,
+                 sigma_star_outcome_component: np.ndarray = None,
+                 sigma_star_repeated_measure_component: np.ndarray = None,
                  sigma_star_cluster_component: float = None,
-                 sigma_star_gaussian_adjustment: np.matrix = None,
-                 sigma_star: np.matrix = None,
-                 theta_zero: np.matrix = None,
+                 sigma_star_gaussian_adjustment: np.ndarray = None,
+                 sigma_star: np.ndarray = None,
+                 theta_zero: np.ndarray = None,
                  alpha: float = None,
                  test: Tests = None,
                  total_n: float = None,
@@ -60,7 +105,7 @@ class LinearModel(object):
         Parameters
         ----------
         essence_design_matrix
-            the design matrix X
+            the essence design matrix Es(X). This is diagonal, and is stored as the vector of its diagonal elements.
         covariance_matrix
             BETA, the matrix of hypothesized regression coefficients
         c_matrix
@@ -72,6 +117,7 @@ class LinearModel(object):
         theta_zero
             the matrix of constants to be subtracted from C*BETA*U (CBU)
         """
+        self._facts = dict()
         self.full_beta = full_beta
         self.essence_design_matrix = essence_design_matrix
         self.repeated_rows_in_design_matrix = repeated_rows_in_design_matrix
@@ -83,14 +129,13 @@ class LinearModel(object):
         self.sigma_star_cluster_component = sigma_star_cluster_component
         self.sigma_star_gaussian_adjustment = sigma_star_gaussian_adjustment
         self.sigma_star = sigma_star
+        # the Kronecker factors of U and of the repeated measure component of sigma star, if U is Kronecker
+        # structured. Used to calculate sigma star factor by factor.
+        self.u_matrix_factors = None
+        self.sigma_star_repeated_measure_factors = None
         self.theta_zero = theta_zero
         self.alpha = alpha
         self.total_n = total_n
-        self.theta = None
-        self.m = None
-        self.error_sum_square = None
-        self.hypothesis_sum_square = None
-        self.nu_e = None
         self.errors = set([])
         self.test = test
         self.target_power = target_power
@@ -98,19 +143,50 @@ class LinearModel(object):
         self.scale_factor = scale_factor
         self.variance_scale_factor = variance_scale_factor
         self.minimum_smallest_group_size = smallest_realizable_design
-        self.delta = delta
+        if delta is not None:
+            self.delta = delta
         self.groups = groups
-        self.calc_metadata()
         self.power_method = power_method
         self.quantile = quantile
         self.confidence_interval = confidence_interval
         self.orthonormalize_u_matrix = orthonormalize_u_matrix
+        self.noncentrality_distribution = None
 
         if kwargs.get('study_design'):
             self.from_study_design(kwargs['study_design'])
 
+    theta = _metadata('theta', 'calc_theta')
+    m = _metadata('m', 'calc_m')
+    nu_e = _metadata('nu_e', 'calc_nu_e')
+    delta = _metadata('delta', 'calc_delta')
+    hypothesis_sum_square = _metadata('hypothesis_sum_square', 'calc_hypothesis_sum_square')
+    error_sum_square = _metadata('error_sum_square', 'calc_error_sum_square')
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_facts', None):
+            self._invalidate(name)
+        object.__setattr__(self, name, value)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        # restore the cached facts as they were, rather than invalidating them as each attribute is set
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def _invalidate(self, name):
+        for fact in self._CACHE_DEPENDENCIES.get(name, []):
+            self._facts.pop(fact, None)
+            self._invalidate(fact)
+
+    def _cached(self, fact, calculate):
+        if fact not in self._facts:
+            self._facts[fact] = calculate()
+        return self._facts[fact]
+
     def to_dict(self):
-        ret = dict(essence_design_matrix=utilities.serialise_matrix(self.essence_design_matrix),
+        ret = dict(essence_design_matrix=utilities.serialise_matrix(self.get_dense_essence_design_matrix()),
                    repeated_rows_in_design_matrix=self.repeated_rows_in_design_matrix,
                    full_beta = self.full_beta,
                    hypothesis_beta=utilities.serialise_matrix(self.hypothesis_beta),
@@ -118,17 +194,17 @@ class LinearModel(object):
                    u_matrix=utilities.serialise_matrix(self.u_matrix),
                    sigma_star_outcome_component=utilities.serialise_matrix(self.sigma_star_outcome_component),
                    sigma_star_repeated_measure_component=utilities.serialise_matrix(self.sigma_star_repeated_measure_component),
-                   sigma_star_cluster_component=utilities.serialise_matrix(np.matrix(self.sigma_star_cluster_component)),
+                   sigma_star_cluster_component=utilities.serialise_matrix(np.array(self.sigma_star_cluster_component, ndmin=2)),
                    sigma_star_gaussian_adjustment=utilities.serialise_matrix(self.sigma_star_gaussian_adjustment),
                    sigma_star=utilities.serialise_matrix(self.sigma_star),
                    theta_zero=utilities.serialise_matrix(self.theta_zero),
                    alpha=self.alpha,
                    total_n=self.total_n,
-                   theta=utilities.serialise_matrix(self.theta),
-                   m=utilities.serialise_matrix(self.m),
-                   nu_e=self.nu_e,
-                   hypothesis_sum_square=utilities.serialise_matrix(self.hypothesis_sum_square),
-                   error_sum_square=utilities.serialise_matrix(self.error_sum_square),
+                   theta=utilities.serialise_matrix(self._metadata_or_none('theta')),
+                   m=utilities.serialise_matrix(self._metadata_or_none('m')),
+                   nu_e=self._metadata_or_none('nu_e'),
+                   hypothesis_sum_square=utilities.serialise_matrix(self._metadata_or_none('hypothesis_sum_square')),
+                   error_sum_square=utilities.serialise_matrix(self._metadata_or_none('error_sum_square')),
                    errors=utilities.serialise_errors(self.errors),
                    test=self.getTest(),
                    target_power = self.target_power,
@@ -136,7 +212,7 @@ class LinearModel(object):
                    means_scale_factor = self.scale_factor,
                    variance_scale_factor = self.variance_scale_factor,
                    smallest_realizable_design=self.minimum_smallest_group_size,
-                   delta=utilities.serialise_matrix(self.delta),
+                   delta=utilities.serialise_matrix(self._metadata_or_none('delta')),
                    groups=self.groups,
                    power_method=self.power_method,
                    quantile=self.quantile,
@@ -146,41 +222,120 @@ class LinearModel(object):
         return ret
 
 
-    def from_study_design(self, study_design: StudyDesign, inputs: ScenarioInputs, orthonormalize_u_matrix):
+    @classmethod
+    def precompute_design(cls, study_design: StudyDesign, orthonormalize_u_matrix) -> DesignPrecomputation:
+        """
+        Build the parts of a LinearModel which do not depend on the ScenarioInputs, so that they can be shared by
+        every model generated from a study design.
+
+        :param study_design: A StudyDesign defined by the user
+        :param orthonormalize_u_matrix: Whether the partial U matrices should be orthonormalized
+        :return: DesignPrecomputation
+        """
+        builder = cls(full_beta=study_design.full_beta, orthonormalize_u_matrix=orthonormalize_u_matrix)
+        precomputation = DesignPrecomputation(full_beta=study_design.full_beta,
+                                              orthonormalize_u_matrix=orthonormalize_u_matrix)
+        isu_factors = study_design.isu_factors
+        try:
+            precomputation.essence_design_matrix = builder.calculate_design_matrix(isu_factors)
+            precomputation.groups = builder.get_groups(isu_factors)
+            precomputation.hypothesis_beta = builder.get_beta(isu_factors)
+            builder.c_matrix = precomputation.c_matrix = builder.calculate_c_matrix(isu_factors)
+            builder.u_matrix = precomputation.u_matrix = builder.calculate_u_matrix(isu_factors)
+            builder.u_matrix_factors = builder.calculate_u_matrix_factors(isu_factors)
+            builder.sigma_star_outcome_component = builder.calculate_outcome_sigma_star(isu_factors)
+            builder.sigma_star_repeated_measure_factors = builder.calculate_rep_measure_sigma_star_factors(isu_factors)
+            builder.sigma_star_repeated_measure_component = builder.calculate_rep_measure_sigma_star(isu_factors)
+            builder.sigma_star_cluster_component = builder.calculate_cluster_sigma_star(isu_factors)
+            builder.sigma_star_gaussian_adjustment = builder.calculate_gaussian_adjustment(study_design.gaussian_covariate)
+            precomputation.sigma_star_outcome_component = builder.sigma_star_outcome_component
+            precomputation.sigma_star_repeated_measure_component = builder.sigma_star_repeated_measure_component
+            precomputation.sigma_star_cluster_component = builder.sigma_star_cluster_component
+            precomputation.sigma_star_gaussian_adjustment = builder.sigma_star_gaussian_adjustment
+            precomputation.unadjusted_sigma_star = builder.calculate_unadjusted_sigma_star(isu_factors.uMatrix.hypothesis_type)
+            precomputation.theta_zero = isu_factors.theta0
+            builder.essence_design_matrix = precomputation.essence_design_matrix
+            builder.get_rank_c()
+            builder.get_rank_u()
+            builder.get_rank_essence_design_matrix()
+            precomputation.facts = {fact: builder._facts[fact] for fact in cls._DESIGN_FACTS if fact in builder._facts}
+            cls._precompute_scaled_metadata(builder, precomputation)
+            precomputation.complete = True
+        except (GlimmpseValidationException, GlimmpseCalculationException) as e:
+            builder.errors.add(e)
+        except Exception as e:
+            traceback.print_exc()
+            builder.errors.add(GlimmpseValidationException(Constants.ERR_UNEXPECTED.value))
+        precomputation.errors.update(builder.errors)
+        return precomputation
+
+    @staticmethod
+    def _precompute_scaled_metadata(builder, precomputation: DesignPrecomputation):
+        """
+        If theta zero is zero, theta = C BETA U scales with the means scale factor and delta with its square, so the
+        unscaled theta and delta can be calculated once and rescaled for each model. M does not depend on the
+        ScenarioInputs at all.
+        """
+        theta_zero = precomputation.theta_zero
+        if theta_zero is None or np.any(theta_zero):
+            return
+        try:
+            builder.hypothesis_beta = precomputation.hypothesis_beta
+            builder.theta_zero = theta_zero
+            precomputation.theta = builder.theta
+            precomputation.m = builder.m
+            precomputation.m_factor = builder.get_m_factor()
+            precomputation.m_is_singular = builder.is_m_singular()
+            precomputation.delta = builder.delta
+            precomputation.scalable = True
+        except Exception:
+            precomputation.scalable = False
+
+    def from_study_design(self, study_design: StudyDesign, inputs: ScenarioInputs, orthonormalize_u_matrix,
+                          precomputation: DesignPrecomputation = None):
         """
         Populate a LinearModel with Values from a study design.
 
         :param study_design: A StudyDesign defined by the user
-        :param alpha: The Type one error to be used
-        :param target_power: The power for which minimum samplesize should be calculated
+        :param inputs: The ScenarioInputs (alpha, target power, scale factors etc.) for this model
+        :param orthonormalize_u_matrix: Whether the partial U matrices should be orthonormalized
+        :param precomputation: The design invariant parts of the model. Built from study_design if not supplied.
         :return: LinearModel
         """
+        if precomputation is None:
+            precomputation = LinearModel.precompute_design(study_design, orthonormalize_u_matrix)
 
         try:
             self.orthonormalize_u_matrix = orthonormalize_u_matrix
             self.full_beta = study_design.full_beta
-            self.essence_design_matrix = self.calculate_design_matrix(study_design.isu_factors)
+            self.essence_design_matrix = precomputation.essence_design_matrix
             self.repeated_rows_in_design_matrix = inputs.smallest_group_size
-            self.hypothesis_beta = self.get_beta(study_design.isu_factors, inputs)
-            self.c_matrix = self.calculate_c_matrix(study_design.isu_factors)
-            self.u_matrix = self.calculate_u_matrix(study_design.isu_factors)
-            self.sigma_star_outcome_component = self.calculate_outcome_sigma_star(study_design.isu_factors, inputs)
-            self.sigma_star_repeated_measure_component = self.calculate_rep_measure_sigma_star(study_design.isu_factors)
-            self.sigma_star_cluster_component = self.calculate_cluster_sigma_star(study_design.isu_factors)
-            self.sigma_star_gaussian_adjustment = self.calculate_gaussian_adjustment(study_design.gaussian_covariate)
-            self.sigma_star = self.calculate_sigma_star(study_design.isu_factors.uMatrix.hypothesis_type)
-            self.theta_zero = study_design.isu_factors.theta0
+            self.c_matrix = precomputation.c_matrix
+            self.u_matrix = precomputation.u_matrix
+            self.sigma_star_repeated_measure_component = precomputation.sigma_star_repeated_measure_component
+            self.sigma_star_cluster_component = precomputation.sigma_star_cluster_component
+            self.sigma_star_gaussian_adjustment = precomputation.sigma_star_gaussian_adjustment
+            self._facts.update(precomputation.facts)
+            self.errors.update(precomputation.errors)
+            if not precomputation.complete:
+                return
+            self.hypothesis_beta = precomputation.hypothesis_beta * inputs.scale_factor
+            self.sigma_star_outcome_component = precomputation.sigma_star_outcome_component * inputs.variance_scale_factor
+            self.set_sigma_star(self.adjust_sigma_star(precomputation.unadjusted_sigma_star * inputs.variance_scale_factor))
+            self.theta_zero = precomputation.theta_zero
             self.alpha = inputs.alpha
             self.test = inputs.test
-            self.alpha = inputs.alpha
             self.target_power = inputs.target_power
             self.scale_factor = inputs.scale_factor
             self.variance_scale_factor = inputs.variance_scale_factor
             self.smallest_group_size = inputs.smallest_group_size
-            self.total_n = self.calculate_total_n(study_design.isu_factors, inputs)
-            self.calc_metadata()
+            self.groups = precomputation.groups
+            self.total_n = sum([self.smallest_group_size * g for g in self.groups])
+            if precomputation.scalable:
+                self.calc_scaled_metadata(precomputation)
+            else:
+                self.calc_metadata()
             np.set_printoptions(precision=18)
-            self.groups = self.get_groups(study_design.isu_factors)
             self.power_method = inputs.power_method
             self.quantile = inputs.quantile
             self.confidence_interval = inputs.confidence_interval
@@ -200,16 +355,16 @@ class LinearModel(object):
             self.errors.add(e)
         except Exception as e:
             traceback.print_exc()
-            self.errors.add(GlimmpseValidationException("Sorry, something seems to have gone wrong with our calculations. Please contact us at samplesizeshop@gmail.com."))
+            self.errors.add(GlimmpseValidationException(Constants.ERR_UNEXPECTED.value))
 
     def calculate_noncentrality_distribution(self, study_design: StudyDesign):
         dist = NonCentralityDistribution(test=self.test,
-                                         FEssence=self.essence_design_matrix,
+                                         FEssence=utilities.as_matrix(self.get_dense_essence_design_matrix()),
                                          perGroupN=self.smallest_group_size,
-                                         CFixed=self.c_matrix,
-                                         CGaussian=np.zeros([self.get_rank_c(), 1]),
-                                         thetaDiff=self.theta-self.theta_zero,
-                                         sigmaStar=self.sigma_star,
+                                         CFixed=utilities.as_matrix(self.c_matrix),
+                                         CGaussian=utilities.as_matrix(np.zeros([self.get_rank_c(), 1])),
+                                         thetaDiff=utilities.as_matrix(self.theta - self.theta_zero),
+                                         sigmaStar=utilities.as_matrix(self.sigma_star),
                                          stddevG=study_design.gaussian_covariate.standard_deviation,
                                          exact=study_design.gaussian_covariate.exact)
         return dist
@@ -217,20 +372,20 @@ class LinearModel(object):
 
     def calculate_min_smallest_group_size(self, isu_factors, inputs):
         if self.errors and Constants.ERR_ERROR_DEG_FREEDOM in self.errors:
-            while self.nu_e <= 0:
-                self.smallest_group_size = self.smallest_group_size + 1
-                self.total_n = self.calculate_total_n(isu_factors, inputs)
-                self.calc_metadata()
+            # nu_e = int(smallest_group_size * sum(groups) - rank(X)) is linear in the smallest group size, so the
+            # smallest group size giving nu_e >= 1 can be found directly.
+            rank_x = self.get_rank_essence_design_matrix()
+            smallest_group_size = max(self.smallest_group_size + 1, math.ceil((rank_x + 1) / sum(self.groups)))
+            while smallest_group_size * sum(self.groups) - rank_x < 1:
+                smallest_group_size = smallest_group_size + 1
+            self.smallest_group_size = smallest_group_size
+            self.total_n = self.calculate_total_n(isu_factors, inputs)
+            self.calc_metadata()
             self.errors.remove(Constants.ERR_ERROR_DEG_FREEDOM)
         self.minimum_smallest_group_size = self.smallest_group_size
 
     def calculate_total_n(self, isu_factors, inputs: ScenarioInputs):
-        groups = [1]
-        predictors = isu_factors.get_predictors()
-        predictors_in_hypothesis = [f for f in predictors if type(f) == Predictor]
-        if len(predictors_in_hypothesis) > 0:
-            tables = [t.get('_table') for t in isu_factors.between_isu_relative_group_sizes]
-            groups = [c.get('value') for t in tables for r in t for c in r]
+        groups = self.get_groups(isu_factors)
         total_n = sum([self.smallest_group_size * g for g in groups])
         return total_n
 
@@ -238,70 +393,80 @@ class LinearModel(object):
         groups = [1]
         predictors = isu_factors.get_predictors()
         predictors_all = [f for f in predictors if type(f) == Predictor]
-        if len(predictors_all) > 0:
+        if len(predictors_all) > 0 and isu_factors.between_isu_relative_group_sizes_array is not None:
+            groups = isu_factors.between_isu_relative_group_sizes_array.ravel().tolist()
+        elif len(predictors_all) > 0:
             tables = [t.get('_table') for t in isu_factors.between_isu_relative_group_sizes]
             groups = [c.get('value') for t in tables for r in t for c in r]
         return groups
 
-    def collapse_relative_group_sizes(self, predictors_in_hypothesis, predictors, tables):
+    def collapse_relative_group_sizes(self, predictors_in_hypothesis, predictors, group_sizes: np.ndarray):
         """
-        Collapse table by adding across the omitted dimensions.
+        Collapse the relative group sizes by adding across the omitted dimensions.
 
-        :param predictors_in_hypothesis:
-        :param predictors:
-        :param tables:
-        :return:
+        :param predictors_in_hypothesis: the predictors to keep
+        :param predictors: the predictors along the axes of group_sizes, in order
+        :param group_sizes: relative group sizes with one axis per predictor
+        :return: the collapsed group sizes, flattened
         """
-        omitted_dimensions = [p.name for p in predictors if p not in predictors_in_hypothesis]
-        all_values = [c for t in tables for r in t for c in r]
-        reduced_list = [(self.get_reduced_id(val, omitted_dimensions), val.get('value')) for val in all_values]
-        x = [(k, list(list(zip(*g))[1])) for k, g in groupby(reduced_list, itemgetter(0))]
-
-        groups = dict.fromkeys(set([v[0] for v in x]), 0)
-
-        for val in x:
-            total = sum(val[1]) + groups.get(val[0])
-            groups.update({val[0]: total})
-
-        return list(groups.values())
-
-    def get_reduced_id(self, val, omitted_dimensions):
-        return GroupId([val for val in val.get('id') if val.get('factorName') not in omitted_dimensions])
+        omitted_axes = tuple(i for i, p in enumerate(predictors) if p not in predictors_in_hypothesis)
+        return np.sum(group_sizes, axis=omitted_axes).ravel().tolist()
 
     def calc_metadata(self):
-        self.theta = self.calc_theta()
-        self.m = self.calc_m()
-        self.nu_e = self.calc_nu_e()
-        self.hypothesis_sum_square = self.calc_hypothesis_sum_square()
-        self.error_sum_square = self.calc_error_sum_square()
-        self.delta = self.calc_delta()
+        """
+        Calculate theta, M, nu_e, delta and the hypothesis and error sums of squares now rather than when they are
+        first asked for, so that any errors are found. Only those which are not already cached are calculated.
+        """
+        self.theta
+        self.m
+        self.nu_e
+        self.delta
+        self.hypothesis_sum_square
+        self.error_sum_square
+
+    def calc_scaled_metadata(self, precomputation: DesignPrecomputation):
+        """calc_metadata, rescaling the unscaled theta and delta of a design with a theta zero of zero."""
+        self.theta = precomputation.theta * self.scale_factor
+        self.m = precomputation.m
+        self._facts['m_factor'] = precomputation.m_factor
+        self._facts['m_is_singular'] = precomputation.m_is_singular
+        self.delta = None if precomputation.delta is None else precomputation.delta * self.scale_factor ** 2
+        self.calc_metadata()
 
     def calc_nu_e(self):
         if self.total_n is None or self.essence_design_matrix is None:
             return None
-        nu_e = self.total_n - np.linalg.matrix_rank(self.essence_design_matrix)
+        nu_e = self.total_n - self.get_rank_essence_design_matrix()
         if int(nu_e) <= 0:
             self.errors.add(Constants.ERR_ERROR_DEG_FREEDOM)
         return int(nu_e)
 
 
-    def get_beta(self, isu_factors, inputs: ScenarioInputs):
+    def get_beta(self, isu_factors, scale_factor: float = 1):
+        if isu_factors.marginal_means_array is not None:
+            return np.asarray(isu_factors.marginal_means_array) * scale_factor
         components = [self.get_combination_table_matrix(t) for t in isu_factors.marginal_means]
-        beta = np.concatenate(tuple(components), axis=1) * inputs.scale_factor
+        beta = np.concatenate(tuple(components), axis=1) * scale_factor
         return beta
 
     def get_combination_table_matrix(self, table):
         rows = [row for row in table.get('_table')]
         t = [self._get_row_values(row) for row in rows]
-        m = np.matrix(t)
+        m = np.array(t)
         return m
 
     def _get_row_values(self, row):
         return [col.get('value') for col in row]
 
     def calculate_design_matrix(self, isu_factors):
+        """The diagonal of the essence design matrix, diag(sqrt(groups))."""
         groups = self.get_groups(isu_factors)
-        return np.matrix(np.diag(np.sqrt(groups)))
+        return np.sqrt(np.array(groups, dtype=float))
+
+    def get_dense_essence_design_matrix(self):
+        if self.essence_design_matrix is None:
+            return None
+        return np.diag(self.essence_design_matrix)
 
     def get_rep_n_from_study_design(self, study_design):
         return study_design.isu_factors.smallest_group_size
@@ -318,7 +483,7 @@ class LinearModel(object):
                 partials = [self.calculate_partial_c_matrix(p) for p in predictors]
             else:
                 partials = [self.calculate_partial_c_matrix(p) for p in predictors if p.in_hypothesis]
-            partials.append(np.matrix(np.identity(1)))
+            partials.append(np.identity(1))
             c_matrix = kronecker_list(partials)
         if not isinstance(c_matrix, int) and np.linalg.matrix_rank(c_matrix) != c_matrix.shape[0]:
             raise GlimmpseValidationException("Your hypothesis is untestable because your between contrast matrix"
@@ -334,10 +499,7 @@ class LinearModel(object):
             if len(l) > 0:
                 u_matrix = isu_factors.uMatrix.values
         else:
-            u_outcomes = np.identity(len(isu_factors.get_outcomes()))
-            u_cluster = np.matrix([[1]])
-            u_repeated_measures = LinearModel._get_repeated_measures_u_matrix(self, isu_factors)
-            u_matrix = kronecker_list([u_outcomes, u_repeated_measures, u_cluster])
+            u_matrix = self.calculate_u_matrix_factors(isu_factors).dense()
 
         if not isinstance(u_matrix, int) and np.linalg.matrix_rank(u_matrix) != u_matrix.shape[1]:
             raise GlimmpseValidationException("Your hypothesis is untestable because your within contrast matrix"
@@ -345,20 +507,29 @@ class LinearModel(object):
                                               "Please change your custom contrast matrix.")
         return u_matrix
 
+    def calculate_u_matrix_factors(self, isu_factors):
+        """U as a KroneckerProduct of the outcome, repeated measure and cluster factors. None for a custom U matrix."""
+        if isu_factors.uMatrix and isu_factors.uMatrix.hypothesis_type == HypothesisType.CUSTOM_U_MATRIX.value:
+            return None
+        u_outcomes = np.identity(len(isu_factors.get_outcomes()))
+        u_cluster = np.array([[1]])
+        u_repeated_measures = self._get_repeated_measures_u_matrix_factors(isu_factors)
+        return KroneckerProduct([u_outcomes, u_repeated_measures, u_cluster])
+
     def _get_repeated_measures_u_matrix(self, isu_factors):
+        return self._get_repeated_measures_u_matrix_factors(isu_factors).dense()
+
+    def _get_repeated_measures_u_matrix_factors(self, isu_factors):
         if self.full_beta:
             partial_u_list = [self.calculate_partial_u_matrix(r) for r in isu_factors.get_repeated_measures()]
         else:
             partial_u_list = [self.calculate_partial_u_matrix(r) for r in isu_factors.get_repeated_measures() if
                               r.in_hypothesis]
         if len(partial_u_list) == 0:
-            partial_u_list = [np.matrix([[1]])]
+            partial_u_list = [np.array([[1]])]
         if self.orthonormalize_u_matrix:
-            orth_partial_u_list = [self._get_orthonormal_u_matrix(x) for x in partial_u_list]
-            u_repeated_measures = kronecker_list(orth_partial_u_list)
-        else:
-            u_repeated_measures = kronecker_list(partial_u_list)
-        return u_repeated_measures
+            partial_u_list = [self._get_orthonormal_u_matrix(x) for x in partial_u_list]
+        return KroneckerProduct(partial_u_list)
 
     def calculate_partial_u_matrix(self, repeated_measure):
         if repeated_measure.in_hypothesis:
@@ -384,7 +555,7 @@ class LinearModel(object):
     @staticmethod
     def calculate_average_partial_u_matrix(repeated_measure):
         no_rep = len(repeated_measure.values)
-        average_matrix = np.matrix(np.ones(no_rep) / no_rep)
+        average_matrix = np.array(np.ones(no_rep) / no_rep, ndmin=2)
         return average_matrix.T
 
     def calculate_partial_c_matrix(self, predictor):
@@ -411,14 +582,14 @@ class LinearModel(object):
     @staticmethod
     def calculate_main_effect_partial_c_matrix(predictor):
         i = np.identity(len(predictor.values) - 1) * -1
-        v = np.matrix([np.ones(len(predictor.values) - 1)])
+        v = np.ones((1, len(predictor.values) - 1))
         main_effect = np.transpose(np.concatenate((v, i), axis=0))
         return main_effect
 
     @staticmethod
     def calculate_main_effect_partial_u_matrix(repeated_mesaure):
         i = np.identity(len(repeated_mesaure.values) - 1) * -1
-        v = np.matrix([np.ones(len(repeated_mesaure.values) - 1)])
+        v = np.ones((1, len(repeated_mesaure.values) - 1))
         main_effect = np.concatenate((v, i), axis=0)
         return main_effect
 
@@ -431,7 +602,7 @@ class LinearModel(object):
         elif no_groups <= 10:
             x = [float(val) for val in predictor.values]
             values = orpol.orpol(x)
-            values = np.matrix(values[:, 1:predictor.polynomial_order])
+            values = np.array(values[:, 1:predictor.polynomial_order], ndmin=2)
             values = values.T
         else:
             warnings.warn('You have more than 10 valueNames in your main effect. We don\'t currently handle this :(')
@@ -446,7 +617,7 @@ class LinearModel(object):
         elif no_groups <= 10:
             x = [float(val) for val in repeated_measure.values]
             values = orpol.orpol(x)
-            values = np.matrix(values[:, 1:repeated_measure.polynomial_order])
+            values = np.array(values[:, 1:repeated_measure.polynomial_order], ndmin=2)
         else:
             warnings.warn('You have more than 10 valueNames in your main effect. We don\'t currently handle this :(')
         return values
@@ -459,9 +630,9 @@ class LinearModel(object):
     def calculate_identity_partial_u_matrix(repeated_measure):
         return np.identity(len(repeated_measure.values))
 
-    def calculate_sigma_star(self, hypothesis_type):
-        """Calculate sigma star from the factors included in the hypothesis, unless full beta has been selected,
-        in which case all factors should be used."""
+    def calculate_unadjusted_sigma_star(self, hypothesis_type):
+        """Calculate sigma star, before removing any gaussian covariate adjustment, from the sigma star components
+        included in the hypothesis, unless full beta has been selected, in which case all factors should be used."""
 
         ##############################################################
         # Important! if at any point this logic is changed, be sure to
@@ -469,32 +640,57 @@ class LinearModel(object):
         # page in the front end web app.
         ##############################################################
         if hypothesis_type in [HypothesisType.CUSTOM_U_MATRIX.value, HypothesisType.POLYNOMIAL.value] and not isinstance(self.u_matrix, int):
-            sigma_star = self.u_matrix.T * kronecker_list([self.sigma_star_outcome_component, self.sigma_star_repeated_measure_component, self.sigma_star_cluster_component]) * self.u_matrix
+            sigma = KroneckerProduct([self.sigma_star_outcome_component,
+                                      self.sigma_star_repeated_measure_factors
+                                      if self.sigma_star_repeated_measure_factors is not None
+                                      else self.sigma_star_repeated_measure_component,
+                                      self.sigma_star_cluster_component])
+            if self.u_matrix_factors is not None and sigma.conforms(self.u_matrix_factors):
+                # U'(A x B x c)U = (U_a' A U_a) x (U_b' B U_b) x c
+                sigma_star = sigma.congruence(self.u_matrix_factors).dense()
+            else:
+                sigma_star = self.u_matrix.T @ sigma.dense() @ self.u_matrix
         else:
             sigma_star = kronecker_list([self.sigma_star_outcome_component, self.sigma_star_repeated_measure_component, self.sigma_star_cluster_component])
-        sigma_star = sigma_star - self.sigma_star_gaussian_adjustment
+        return sigma_star
+
+    def adjust_sigma_star(self, sigma_star):
+        """Remove the gaussian covariate adjustment from sigma star."""
+        return sigma_star - self.sigma_star_gaussian_adjustment
+
+    def set_sigma_star(self, sigma_star):
+        """Set sigma star, keeping its Cholesky factor. Raises if sigma star is not positive definite."""
+        factor = self.cholesky_sigma_star(sigma_star)
+        self.sigma_star = sigma_star
+        self._facts['sigma_star_factor'] = factor
+
+    def get_sigma_star_factor(self):
+        """The lower triangular Cholesky factor of sigma star."""
+        return self._cached('sigma_star_factor', lambda: self.cholesky_sigma_star(self.sigma_star))
+
+    @staticmethod
+    def cholesky_sigma_star(sigma_star):
         try:
-            np.linalg.cholesky(sigma_star)
+            return np.linalg.cholesky(sigma_star)
         except np.linalg.LinAlgError:
             raise GlimmpseValidationException(Constants.ERR_NOT_POSITIVE_DEFINITE.value)
-        return sigma_star
 
     def calculate_gaussian_adjustment(self, gaussian_covariate):
         if not gaussian_covariate:
             return 0
-        corellations = np.matrix(gaussian_covariate.corellations)
-        t = self.u_matrix.T * corellations.T
-        adj = t * (1 / np.power(gaussian_covariate.standard_deviation, 2)) * t.T
+        corellations = np.array(gaussian_covariate.corellations, ndmin=2)
+        t = self.u_matrix.T @ corellations.T
+        adj = t * (1 / np.power(gaussian_covariate.standard_deviation, 2)) @ t.T
         return adj
 
     def calculate_gaussian_adjustment_new(self, gaussian_covariate, isu_factors):
         adj = isu_factors.re * gaussian_covariate.correlations * isu_factors * isu_factors.outcome_correlation_matrix
         return adj
 
-    def calculate_outcome_sigma_star(self, isu_factors, inputs):
+    def calculate_outcome_sigma_star(self, isu_factors, variance_scale_factor: float = 1):
         outcomes = isu_factors.get_outcomes()
-        standard_deviations = np.identity(len(outcomes)) * [o.standard_deviation for o in outcomes] * np.sqrt(inputs.variance_scale_factor)
-        sigma_star_outcomes = standard_deviations * isu_factors.outcome_correlation_matrix * standard_deviations
+        standard_deviations = np.identity(len(outcomes)) * [o.standard_deviation for o in outcomes] * np.sqrt(variance_scale_factor)
+        sigma_star_outcomes = standard_deviations @ isu_factors.outcome_correlation_matrix @ standard_deviations
         try:
             np.linalg.cholesky(sigma_star_outcomes)
         except np.linalg.LinAlgError:
@@ -502,14 +698,18 @@ class LinearModel(object):
         return sigma_star_outcomes
 
     def calculate_rep_measure_sigma_star(self, isu_factors):
+        return self.calculate_rep_measure_sigma_star_factors(isu_factors).dense()
+
+    def calculate_rep_measure_sigma_star_factors(self, isu_factors):
+        """The repeated measure component of sigma star as a KroneckerProduct of the per measure components."""
         if len(isu_factors.get_repeated_measures()) == 0:
-            return np.matrix([[1]])
+            return KroneckerProduct([np.array([[1]])])
         if self.full_beta:
             repeated_measures = [measure for measure in isu_factors.get_repeated_measures()]
         else:
             repeated_measures = [measure for measure in isu_factors.get_repeated_measures() if measure.in_hypothesis]
         if len(repeated_measures) == 0:
-            return np.matrix([[1]])
+            return KroneckerProduct([np.array([[1]])])
         else:
             if isu_factors.uMatrix.hypothesis_type in [HypothesisType.CUSTOM_U_MATRIX.value, HypothesisType.POLYNOMIAL.value]:
                 sigma_star_rep_measure_components = [
@@ -520,26 +720,25 @@ class LinearModel(object):
                     self.calculate_rep_measure_component(measure) for measure in repeated_measures
                 ]
                 sigma_star_rep_measure_components.append(np.identity(1))
-            sigma_star_rep_measures = kronecker_list(sigma_star_rep_measure_components)
-            return sigma_star_rep_measures
+            return KroneckerProduct(sigma_star_rep_measure_components)
 
     def calculate_rep_measure_component(self, repeated_measure):
         st = np.diag(repeated_measure.standard_deviations)
-        sigma_r = st * repeated_measure.correlation_matrix * st
+        sigma_r = st @ repeated_measure.correlation_matrix @ st
         u = self.calculate_partial_u_matrix(repeated_measure)
         if self.orthonormalize_u_matrix:
             u = LinearModel._get_orthonormal_u_matrix(u)
-        component = np.transpose(u) * sigma_r * u
+        component = np.transpose(u) @ sigma_r @ u
         return component
 
     def calculate_rep_measure_sigma(self, repeated_measure):
         st = np.diag(repeated_measure.standard_deviations)
-        sigma_r = st * repeated_measure.correlation_matrix * st
+        sigma_r = st @ repeated_measure.correlation_matrix @ st
         return sigma_r
 
     def calculate_cluster_sigma_star(self, isu_factors):
         if len(isu_factors.get_clusters()) == 0:
-            return np.matrix([[1]])
+            return np.array([[1]])
         cluster = isu_factors.get_clusters()[0]
         components = [
             (1 + (level.no_elements - 1) * level.intra_class_correlation) / level.no_elements
@@ -581,32 +780,46 @@ class LinearModel(object):
     def calc_theta(self):
         if self.c_matrix is None or self.hypothesis_beta is None or self.u_matrix is None:
             return None
-        return self.c_matrix * self.hypothesis_beta * self.u_matrix
+        # np.dot rather than @, as C or U may be the scalar 1
+        return np.dot(np.dot(self.c_matrix, self.hypothesis_beta), self.u_matrix)
 
     def calc_m(self):
         if self.c_matrix is None or self.essence_design_matrix is None:
             return None
-        return (self.c_matrix *
-                self.getMatrixInverse((np.transpose(self.essence_design_matrix) * self.essence_design_matrix))
-                * np.transpose(self.c_matrix))
+        # Es(X)'Es(X) = diag(groups), so M = C diag(1/groups) C'
+        x_squared = np.square(self.essence_design_matrix)
+        if not np.all(x_squared):
+            raise np.linalg.LinAlgError('Singular matrix')
+        if np.ndim(self.c_matrix) == 0:
+            # a custom C with no between factors in the hypothesis is the scalar 1, giving c diag(1/groups) c
+            return np.diag(np.square(self.c_matrix) / x_squared)
+        c_matrix = np.atleast_2d(self.c_matrix)
+        return np.dot(np.multiply(c_matrix, 1 / x_squared), np.transpose(c_matrix))
 
     def calc_error_sum_square(self):
         if self.nu_e is None or self.sigma_star is None:
             return None
         return self.nu_e * self.sigma_star
 
-    def calc_hypothesis_sum_square(self):
-        if self.theta is None or self.theta_zero is None or self.m is None or self.getMatrixDeterminantIsZero(self.m):
+    def calc_hypothesis_sum_square(self, delta=None):
+        """N (theta - theta0)' M^-1 (theta - theta0), from the model's delta if delta is not given."""
+        if delta is None:
+            delta = self.delta
+        if delta is None:
             return None
-        t = (self.theta - self.theta_zero)
-        return self.repeated_rows_in_design_matrix * np.transpose(t) * self.getMatrixInverse(self.m) * t
+        return self.repeated_rows_in_design_matrix * delta
 
     def calc_delta(self):
-        if self.theta_zero is None or self.theta is None or self.m is None or self.getMatrixDeterminantIsZero(self.m):
+        """(theta - theta0)' M^-1 (theta - theta0), by solves with the factorisation of M."""
+        if self.theta_zero is None or self.theta is None or self.m is None or self.is_m_singular():
             return None
         else:
             t = (self.theta - self.theta_zero)
-            return t.T * self.getMatrixInverse(self.m) * t
+            method, factor = self.get_m_factor()
+            if method == 'cholesky':
+                z = linalg.solve_triangular(factor, t, lower=True)
+                return z.T @ z
+            return t.T @ linalg.lu_solve(factor, t)
 
     def print_errors(self):
         out = ""
@@ -623,6 +836,16 @@ class LinearModel(object):
     def serialize(self):
         return json.dumps(self, cls=LinearModelEncoder)
 
+    def _metadata_or_none(self, name):
+        """
+        A metadata property, or None if it cannot be calculated, so that a model which failed can still be
+        serialised. The error was recorded in errors when the model was built.
+        """
+        try:
+            return getattr(self, name)
+        except Exception:
+            return None
+
     def serializeCI(self):
         if self.confidence_interval:
             return self.confidence_interval.to_dict()
@@ -630,14 +853,54 @@ class LinearModel(object):
             return None
 
     def get_rank_x(self):
-        rank_x = np.linalg.matrix_rank(self.essence_design_matrix)
+        rank_x = self.get_rank_essence_design_matrix()
         if self.noncentrality_distribution:
             rank_x = rank_x + 1
         return rank_x
 
+    def get_rank_essence_design_matrix(self):
+        return self._cached('rank_x', lambda: utilities.rank(self.essence_design_matrix,
+                                                             self.get_singular_values_x()))
+
     def get_rank_c(self):
-        rank_c = np.linalg.matrix_rank(self.c_matrix)
-        return rank_c
+        return self._cached('rank_c', lambda: utilities.rank(self.c_matrix, self.get_singular_values_c()))
+
+    def get_rank_u(self):
+        return self._cached('rank_u', lambda: utilities.rank(self.u_matrix, self.get_singular_values_u()))
+
+    def get_singular_values_x(self):
+        return self._cached('singular_values_x', lambda: utilities.singular_values(self.essence_design_matrix))
+
+    def get_singular_values_c(self):
+        return self._cached('singular_values_c', lambda: utilities.singular_values(self.c_matrix))
+
+    def get_singular_values_u(self):
+        return self._cached('singular_values_u', lambda: utilities.singular_values(self.u_matrix))
+
+    def get_m_factor(self):
+        """
+        Factorisation of M: ('cholesky', L) with M = LL' if M is positive definite, otherwise ('lu', (lu, piv)) as
+        returned by scipy.linalg.lu_factor, or ('singular', None) if M is singular.
+        """
+        return self._cached('m_factor', lambda: LinearModel.factorise(self.m))
+
+    @staticmethod
+    def factorise(matrix):
+        matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+        try:
+            return 'cholesky', np.linalg.cholesky(matrix)
+        except np.linalg.LinAlgError:
+            pass
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', linalg.LinAlgWarning)
+            lu, piv = linalg.lu_factor(matrix, check_finite=False)
+        # the determinant is the product of the pivots
+        if np.any(np.diag(lu) == 0):
+            return 'singular', None
+        return 'lu', (lu, piv)
+
+    def is_m_singular(self):
+        return self._cached('m_is_singular', lambda: self.get_m_factor()[0] == 'singular')
 
     def getTest(self):
         if self and hasattr(self, 'test') and hasattr(self.test, 'value'):
@@ -647,30 +910,6 @@ class LinearModel(object):
         else:
             return None
 
-    def getMatrixInverse(self, matrix):
-        """Numpy doesnt habdle matrix multiplication of a 1x1 with matrices of larger dimensions well.
-            This convinience method returns the inverse of the matrix OR 1/the value of the 1x2 matrix"""
-        matrix = self.get1by1AsScalar(matrix)
-        if isinstance(matrix, float) or isinstance(matrix, int):
-            return 1 / matrix
-        else:
-            return np.linalg.inv(matrix)
-
-    def getMatrixDeterminantIsZero(self, matrix):
-        """Numpy doesnt habdle matrix multiplication of a 1x1 with matrices of larger dimensions well.
-            This convinience method returns whether the determinant of the matrix is zero
-            OR whether the value of the scalar is zero"""
-        matrix = self.get1by1AsScalar(matrix)
-        if isinstance(matrix, float) or isinstance(matrix, int):
-            return matrix == 0
-        else:
-            return np.linalg.det(matrix) == 0
-
-    def get1by1AsScalar(self, matrix):
-        if type(matrix) == np.matrixlib.defmatrix.matrix and matrix.shape == (1, 1):
-            matrix = matrix[0, 0]
-        return matrix
-
 class LinearModelEncoder(JSONEncoder):
     def default(self, obj):
         if isinstance(obj, LinearModel):
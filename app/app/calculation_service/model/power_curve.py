@@ -36,10 +36,18 @@ class PowerCurve(object):
                  confidence_interval: ConfidenceInterval=None,
                  x_axis: str=None,
                  data_series: []=None,
+                 x_axis_values: []=None,
+                 adaptive: bool=False,
+                 tolerance: float=0.005,
+                 max_points: int=64,
                  **kwargs):
         self.confidence_interval = confidence_interval
         self.x_axis = x_axis
         self.data_series = data_series
+        self.x_axis_values = x_axis_values
+        self.adaptive = adaptive
+        self.tolerance = tolerance
+        self.max_points = max_points
 
         if kwargs.get('source'):
             self.from_dict(kwargs['source'])
@@ -51,3 +59,11 @@ class PowerCurve(object):
             self.x_axis = source['_xAxis']
         if source.get('_dataSeries'):
             self.data_series = [DataSeries(source=ds) for ds in source['_dataSeries']]
+        if source.get('_xAxisValues'):
+            self.x_axis_values = [val for val in source['_xAxisValues']]
+        if source.get('_adaptive'):
+            self.adaptive = source['_adaptive']
+        if source.get('_tolerance'):
+            self.tolerance = source['_tolerance']
+        if source.get('_maxPoints'):
+            self.max_points = source['_maxPoints']
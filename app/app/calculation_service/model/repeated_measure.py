@@ -18,8 +18,8 @@ class RepeatedMeasure(IsuFactor):
                  units: str=None,
                  type: str=None,
                  no_repeats: int=2,
-                 partial_u_matrix: np.matrix= None,
-                 correlation_matrix: np.matrix = None,
+                 partial_u_matrix: np.ndarray= None,
+                 correlation_matrix: np.ndarray = None,
                  standard_deviations: [] = None,
                  **kwargs):
         super().__init__(name=name,
@@ -33,9 +33,9 @@ class RepeatedMeasure(IsuFactor):
         self.units = units
         self.type = type
         self.no_repeats = no_repeats
-        self.partial_u_matrix = np.matrix(partial_u_matrix)
-        self.correlation_matrix = np.matrix(correlation_matrix)
-        self.standard_deviations = np.matrix(standard_deviations)
+        self.partial_u_matrix = np.array(partial_u_matrix, ndmin=2)
+        self.correlation_matrix = np.array(correlation_matrix, ndmin=2)
+        self.standard_deviations = np.array(standard_deviations, ndmin=2)
 
         if kwargs.get('source'):
             self.from_dict(kwargs['source'])
@@ -66,11 +66,11 @@ class RepeatedMeasure(IsuFactor):
         if (source.get('partialUMatrix')
                 and source['partialUMatrix'].get('_values')
                 and source['partialUMatrix']['_values'].get('data')):
-            self.partial_u_matrix = np.matrix(source['partialUMatrix']['_values']['data'])
+            self.partial_u_matrix = np.array(source['partialUMatrix']['_values']['data'], ndmin=2)
         if (source.get('correlationMatrix')
                 and source['correlationMatrix'].get('_values')
                 and source['correlationMatrix']['_values'].get('data')):
-            self.correlation_matrix = np.matrix(source['correlationMatrix']['_values']['data'])
+            self.correlation_matrix = np.array(source['correlationMatrix']['_values']['data'], ndmin=2)
         if source.get('standard_deviations'):
             self.standard_deviations = source['standard_deviations']
 
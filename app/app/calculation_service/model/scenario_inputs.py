@@ -1,9 +1,12 @@
+import copy
+import itertools
 import json
 from json import JSONDecoder
 
 from app.calculation_service.model.enums import Tests, SolveFor
 from app.calculation_service.model.isu_factors import IsuFactors
 from app.calculation_service.model.confidence_interval import ConfidenceInterval
+from app.calculation_service.utilities import fingerprint
 
 
 class ScenarioInputs:
@@ -49,10 +52,60 @@ class ScenarioInputs:
     def load_from_json(self, json_str: str):
         return json.loads(json_str, cls=ScenarioInputsDecoder)
 
+    def load_from_dict(self, d: dict, isu_factors: IsuFactors = None) -> []:
+        """
+        The ScenarioInputs for every combination of the input values in a parsed request.
+
+        :param d: the parsed JSON request
+        :param isu_factors: IsuFactors already built from d['_isuFactors'], if there are any
+        :return: list of ScenarioInputs
+        """
+        return ScenarioInputsDecoder().decode_dict(d, isu_factors)
+
+    def grid_from_dict(self, d: dict, isu_factors: IsuFactors = None) -> 'ScenarioGrid':
+        """
+        The ScenarioInputs for every combination of the input values in a parsed request, generated as they are
+        iterated over rather than held in a list.
+
+        :param d: the parsed JSON request
+        :param isu_factors: IsuFactors already built from d['_isuFactors'], if there are any
+        :return: ScenarioGrid
+        """
+        return ScenarioInputsDecoder().grid_dict(d, isu_factors)
+
+    def fingerprint(self) -> str:
+        return fingerprint(self)
+
+    def normalised(self, gaussian_covariate: bool) -> 'ScenarioInputs':
+        """
+        A copy holding only the values which affect the calculation, so that inputs which are calculated in the same
+        way are equal.
+
+        The quantile is only used with a Gaussian covariate, and the power method only through the quantile, so the
+        power method is set to the one which is calculated: conditional without a Gaussian covariate, otherwise
+        quantile if there is a quantile and unconditional if not.
+
+        :param gaussian_covariate: whether the study design has a Gaussian covariate
+        """
+        normalised = copy.copy(self)
+        if not gaussian_covariate:
+            normalised.power_method = 'conditional'
+            normalised.quantile = None
+        elif normalised.quantile is not None:
+            normalised.power_method = 'quantile'
+        else:
+            normalised.power_method = 'unconditional'
+        return normalised
+
 
 class ScenarioInputsDecoder(JSONDecoder):
     def decode(self, s: str) -> []:
-        inputs = []
+        return self.decode_dict(json.loads(s))
+
+    def decode_dict(self, d: dict, isu_factors: IsuFactors = None) -> []:
+        return list(self.grid_dict(d, isu_factors))
+
+    def grid_dict(self, d: dict, isu_factors: IsuFactors = None) -> 'ScenarioGrid':
         alpha = []
         target_power = []
         tests = []
@@ -64,11 +117,11 @@ class ScenarioInputsDecoder(JSONDecoder):
         quantiles = [-1]
         confidence_interval = None
 
-        d = json.loads(s)
         if d.get('_solveFor'):
             solve_for = SolveFor(d['_solveFor'])
         if d.get('_isuFactors'):
-            isu_factors = IsuFactors(source=d['_isuFactors'])
+            if isu_factors is None:
+                isu_factors = IsuFactors(source=d['_isuFactors'])
             if solve_for == SolveFor.POWER and isu_factors.smallest_group_size and len(isu_factors.smallest_group_size) > 0:
                 smallest_group_size = isu_factors.smallest_group_size
         if d.get('_power'):
@@ -89,24 +142,33 @@ class ScenarioInputsDecoder(JSONDecoder):
             confidence_interval = ConfidenceInterval(source=d['_confidence_interval'])
 
         if solve_for == SolveFor.POWER:
-            for a in alpha:
-                    for g in smallest_group_size:
-                        for s in scale_factor:
-                            for t in tests:
-                                for v in variance_scale_factor:
-                                    for m in power_method:
-                                        for q in quantiles:
-                                            i = ScenarioInputs(a, None, g, s, t, v, m, q, confidence_interval)
-                                            inputs.append(i)
-        else:
-            for a in alpha:
-                for p in target_power:
-                    for g in smallest_group_size:
-                        for s in scale_factor:
-                            for t in tests:
-                                for v in variance_scale_factor:
-                                    for q in quantiles:
-                                        i = ScenarioInputs(a, p, g, s, t, v, q, confidence_interval)
-                                        inputs.append(i)
-
-        return inputs
+            target_power = [None]
+        return ScenarioGrid(alpha, target_power, smallest_group_size, scale_factor, tests, variance_scale_factor,
+                            power_method, quantiles, confidence_interval)
+
+
+class ScenarioGrid(object):
+    """
+    Every combination of the input values of a request, as ScenarioInputs generated lazily in the order of alpha,
+    target power, smallest group size, scale factor, test, variance scale factor, power method and quantile.
+    """
+
+    def __init__(self, alpha: [], target_power: [], smallest_group_size: [], scale_factor: [], tests: [],
+                 variance_scale_factor: [], power_method: [], quantiles: [], confidence_interval=None):
+        self.axes = [alpha, target_power, smallest_group_size, scale_factor, tests, variance_scale_factor,
+                     power_method, quantiles]
+        self.confidence_interval = confidence_interval
+
+    @property
+    def tests(self) -> []:
+        return self.axes[4]
+
+    def __len__(self):
+        size = 1
+        for axis in self.axes:
+            size *= len(axis)
+        return size
+
+    def __iter__(self):
+        for a, p, g, s, t, v, m, q in itertools.product(*self.axes):
+            yield ScenarioInputs(a, p, g, s, t, v, m, q, self.confidence_interval)
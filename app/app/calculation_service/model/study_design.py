@@ -10,6 +10,7 @@ from app.calculation_service.model.power_curve import PowerCurve
 from app.calculation_service.model.confidence_interval import ConfidenceInterval
 from app.calculation_service.validators import check_options, repn_positive, parameters_positive, valid_approximations, valid_internal_pilot
 from app.calculation_service.model.gaussian_covariate import GaussianCovariate
+from app.calculation_service.utilities import fingerprint
 
 
 class StudyDesign:
@@ -76,37 +77,51 @@ class StudyDesign:
     def load_from_json(self, json_str: str):
         return json.loads(json_str, cls=StudyDesignDecoder)
 
-    def calculate_c_matrix(self):
-        """Calculate the C Matrix from the hypothesis"""
-        partials = [p for p in self.isu_factors.get_hypothesis() if p.nature == Nature.BETWEEN]
-        averages = [p for p in self.isu_factors.variables if p.nature == Nature.BETWEEN and not p.in_hypothesis]
-
+    def load_from_dict(self, d: dict, isu_factors: IsuFactors = None):
+        """
+        Populate the StudyDesign from a parsed request.
 
-class StudyDesignDecoder(JSONDecoder):
-
-    def decode(self, s: str) -> StudyDesign:
-        study_design = StudyDesign()
-        d = json.loads(s)
+        :param d: the parsed JSON request
+        :param isu_factors: IsuFactors already built from d['_isuFactors'], if there are any
+        :return: StudyDesign
+        """
         if d.get('_isuFactors'):
-            study_design.isu_factors = IsuFactors(source=d['_isuFactors'])
+            self.isu_factors = isu_factors if isu_factors is not None else IsuFactors(source=d['_isuFactors'])
         if d.get('_targetEvent'):
-            study_design.target_event = TargetEvent(d['_targetEvent'])
+            self.target_event = TargetEvent(d['_targetEvent'])
         if d.get('_solveFor'):
-            study_design.solve_for = SolveFor(d['_solveFor'])
+            self.solve_for = SolveFor(d['_solveFor'])
         if d.get('_ciwidth'):
-            study_design.confidence_interval_width = d['_ciwidth']
+            self.confidence_interval_width = d['_ciwidth']
         if d.get('_gaussianCovariate'):
-            study_design.gaussian_covariate = GaussianCovariate(source=d['_gaussianCovariate'])
+            self.gaussian_covariate = GaussianCovariate(source=d['_gaussianCovariate'])
         if d.get('_powerCurve'):
-            study_design.power_curve = PowerCurve(source=d['_powerCurve'])
+            self.power_curve = PowerCurve(source=d['_powerCurve'])
         if d.get('_define_full_beta'):
-            study_design.full_beta = d['_define_full_beta']
+            self.full_beta = d['_define_full_beta']
         if d.get('_scaleFactor'):
-            study_design.beta_scalar = d['_scaleFactor']
+            self.beta_scalar = d['_scaleFactor']
         if d.get('_varianceScaleFactors'):
-            study_design.sigma_scalar = d['_varianceScaleFactors']
+            self.sigma_scalar = d['_varianceScaleFactors']
         if d.get('_confidence_interval'):
-            study_design.unirepmethod = Constants.SIGMA_ESTIMATED
+            self.unirepmethod = Constants.SIGMA_ESTIMATED
             if d['_confidence_interval']['beta_known']:
-                study_design.unirepmethod = Constants.SIGMA_KNOWN
-        return study_design
+                self.unirepmethod = Constants.SIGMA_KNOWN
+        return self
+
+    def fingerprint(self) -> str:
+        """Content address of the parts of the design which affect calculated results. The power curve options, and
+        the scale factor lists which are expanded into ScenarioInputs, are left out."""
+        return fingerprint({key: value for key, value in self.__dict__.items()
+                            if key not in ['power_curve', 'beta_scalar', 'sigma_scalar']})
+
+    def calculate_c_matrix(self):
+        """Calculate the C Matrix from the hypothesis"""
+        partials = [p for p in self.isu_factors.get_hypothesis() if p.nature == Nature.BETWEEN]
+        averages = [p for p in self.isu_factors.variables if p.nature == Nature.BETWEEN and not p.in_hypothesis]
+
+
+class StudyDesignDecoder(JSONDecoder):
+
+    def decode(self, s: str) -> StudyDesign:
+        return StudyDesign().load_from_dict(json.loads(s))
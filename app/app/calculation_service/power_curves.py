@@ -0,0 +1,263 @@
+import copy
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from app.calculation_service.model.enums import SolveFor, XAxis
+from app.calculation_service.model.linear_model import LinearModel
+from app.calculation_service.model.power_curve import DataSeries, PowerCurve
+from app.calculation_service.model.scenario_inputs import ScenarioInputs
+from app.calculation_service.model.study_design import StudyDesign
+
+POINTS = 20
+COARSE_POINTS = 5
+DESIRED_POWERS = [round(p, 2) for p in np.arange(1, POINTS) * 0.05]
+MEAN_SCALE_FACTORS = [round(s, 1) for s in np.arange(1, POINTS + 1) * 0.1]
+
+
+class PowerCurveEvaluation(object):
+    """
+    The inputs for every point of every data series of the power curve of a study design, and the results calculated
+    for them as one array per series.
+
+    There is a series for each selected test and DataSeries. Along the DesiredPower axis the total samplesize is
+    found for each target power. Along the TotalSampleSize and MeanScaleFactor axes power is calculated at each
+    point. The inputs of a series differ only along the x axis, so the models of a series are calculated together,
+    by one samplesize search or one power batch.
+
+    Points are held as their position t along the axis: the smallest group size for the TotalSampleSize axis, as
+    only multiples of the sum of the relative group sizes are realizable, and x itself for the other axes.
+    """
+
+    def __init__(self, study_design: StudyDesign, inputs: []):
+        """
+        :param study_design: the StudyDesign of the request, with a PowerCurve
+        :param inputs: the ScenarioInputs of the request, such as a ScenarioGrid. The tests, and the power method,
+                       quantile and confidence interval of the first inputs, are used for every point.
+        :raises ValueError: if the x axis of the power curve is missing or unknown
+        """
+        power_curve = study_design.power_curve or PowerCurve()
+        self.x_axis = XAxis(power_curve.x_axis)
+        self.study_design = copy.copy(study_design)
+        if self.x_axis == XAxis.DESIRED_POWER:
+            self.study_design.solve_for = SolveFor.SAMPLESIZE
+        else:
+            self.study_design.solve_for = SolveFor.POWER
+        # samplesize searches already share their power evaluations, so only power curves are refined
+        self.adaptive = power_curve.adaptive and self.x_axis != XAxis.DESIRED_POWER
+        self.tolerance = power_curve.tolerance
+        self.max_points = power_curve.max_points
+        tests = list(OrderedDict.fromkeys(i.test for i in inputs))
+        self._inputs = next(iter(inputs), None)
+        data_series = power_curve.data_series
+        if not data_series and self._inputs:
+            data_series = [DataSeries(type_I_error=self._inputs.alpha,
+                                      mean_scale_factor=self._inputs.scale_factor,
+                                      variance_scale_factor=self._inputs.variance_scale_factor)]
+        self.series = [(test, ds) for test in tests for ds in data_series or []]
+        self._groups = 1
+        if self.x_axis == XAxis.TOTAL_SAMPLE_SIZE:
+            self._groups = sum(LinearModel().get_groups(self.study_design.isu_factors))
+        self.points = self._points(power_curve.x_axis_values)
+
+    @property
+    def x(self) -> []:
+        return [self._x(t) for t in self.points]
+
+    @property
+    def inputs(self) -> []:
+        return self.inputs_at(self.points)
+
+    def _smallest_group_size(self):
+        return (self.study_design.isu_factors.smallest_group_size or [1])[0]
+
+    def _points(self, x_axis_values) -> []:
+        if self.x_axis == XAxis.DESIRED_POWER:
+            return [float(p) for p in x_axis_values or DESIRED_POWERS]
+        if self.x_axis == XAxis.MEAN_SCALE_FACTOR:
+            return [float(s) for s in x_axis_values or MEAN_SCALE_FACTORS]
+        if x_axis_values:
+            return [int(math.ceil(n / self._groups)) for n in x_axis_values]
+        largest = max(4 * self._smallest_group_size(), POINTS + 1)
+        return np.unique(np.linspace(2, largest, POINTS).astype(int)).tolist()
+
+    def _x(self, t):
+        return t * self._groups if self.x_axis == XAxis.TOTAL_SAMPLE_SIZE else t
+
+    def _midpoint(self, a, b):
+        """The point half way between a and b, or None if there is no realizable point between them."""
+        if self.x_axis == XAxis.TOTAL_SAMPLE_SIZE:
+            return (a + b) // 2 if b - a > 1 else None
+        return (a + b) / 2
+
+    def inputs_at(self, points: []) -> []:
+        """ScenarioInputs for each series at each of points, series by series."""
+        return [self._inputs_at(test, ds, t) for test, ds in self.series for t in points]
+
+    def _inputs_at(self, test, data_series: DataSeries, t):
+        target_power = None
+        smallest_group_size = self._smallest_group_size()
+        scale_factor = data_series.mean_scale_factor
+        if self.x_axis == XAxis.DESIRED_POWER:
+            target_power = t
+            smallest_group_size = 1
+        elif self.x_axis == XAxis.TOTAL_SAMPLE_SIZE:
+            smallest_group_size = t
+        else:
+            scale_factor = t
+        return ScenarioInputs(alpha=data_series.type_I_error,
+                              target_power=target_power,
+                              smallest_group_size=smallest_group_size,
+                              scale_factor=scale_factor,
+                              test=test,
+                              variance_scale_factor=data_series.variance_scale_factor,
+                              power_method=self._inputs.power_method,
+                              quantile=self._inputs.quantile,
+                              confidence_interval=self._inputs.confidence_interval)
+
+    def evaluate(self, calculate) -> dict:
+        """
+        Calculate the curve, at its points or, if it is adaptive, at the points chosen by refine.
+
+        :param calculate: function returning the /calculate result for each of a list of ScenarioInputs, in order
+        :return: the curve as in to_dict
+        """
+        if not self.adaptive:
+            return self.to_dict(calculate(self.inputs))
+        results = OrderedDict()
+
+        def evaluate_points(points):
+            calculated = calculate(self.inputs_at(points))
+            for j, t in enumerate(points):
+                results[t] = calculated[j::len(points)]
+
+        errors = self.refine(evaluate_points, results)
+        points = sorted(results)
+        return self._to_dict(points, [results[t] for t in points], errors)
+
+    def refine(self, evaluate_points, results: dict) -> []:
+        """
+        Evaluate the curve on a coarse grid over the range of its points, then repeatedly subdivide the intervals
+        whose interpolation error is estimated to be larger than the tolerance, until there are max_points points.
+
+        The error of linear interpolation over an interval is measured at its midpoint when it is subdivided. It
+        shrinks with the square of the width of the interval, so each half is estimated to have a quarter of it.
+        The midpoints of every interval to be subdivided are evaluated together.
+
+        :param evaluate_points: function calculating each series at a list of points, adding the results to results
+        :param results: the results of each series at each point evaluated, by point
+        :return: for each series, the largest estimated interpolation error of the final intervals. None if it is
+                 not known, because a series could only be calculated at some of the points of an interval.
+        """
+        coarse = sorted(set(self._coarse_points()))
+        evaluate_points(coarse)
+        estimates = {interval: [math.inf] * len(self.series) for interval in zip(coarse, coarse[1:])}
+        candidates = list(estimates)
+        while candidates:
+            split = []
+            for a, b in sorted(candidates, key=lambda i: -max(estimates[i])):
+                if self._midpoint(a, b) is None:
+                    # no realizable point lies between a and b, so the curve is exact over the interval
+                    estimates[(a, b)] = [0] * len(self.series)
+                elif len(results) + len(split) < self.max_points:
+                    split.append((a, b))
+            candidates = []
+            if not split:
+                break
+            evaluate_points([self._midpoint(a, b) for a, b in split])
+            for a, b in split:
+                m = self._midpoint(a, b)
+                deviations = [_deviation(self._value(fa), self._value(fm), self._value(fb))
+                              for fa, fm, fb in zip(results[a], results[m], results[b])]
+                del estimates[(a, b)]
+                for interval in ((a, m), (m, b)):
+                    estimates[interval] = [d / 4 for d in deviations]
+                    if max(estimates[interval]) > self.tolerance:
+                        candidates.append(interval)
+        errors = [max((e[k] for e in estimates.values()), default=0) for k in range(len(self.series))]
+        return [None if math.isinf(e) else e for e in errors]
+
+    def _coarse_points(self) -> []:
+        lower, upper = min(self.points), max(self.points)
+        if self.x_axis == XAxis.TOTAL_SAMPLE_SIZE:
+            return np.unique(np.linspace(lower, upper, COARSE_POINTS).round().astype(int)).tolist()
+        return np.linspace(lower, upper, COARSE_POINTS).tolist()
+
+    def _value(self, result: dict):
+        """The value plotted for a point: total N along the DesiredPower axis, power along the others."""
+        if self.study_design.solve_for == SolveFor.SAMPLESIZE:
+            return _number(result.get('samplesize'))
+        return _number(result.get('power'))
+
+    def to_dict(self, results: []) -> dict:
+        """
+        The curve as dense arrays: x, and for each series the power, total N, confidence bounds and error at each
+        point. Values which could not be calculated are None, with the reason in errors.
+
+        :param results: the /calculate result for each of self.inputs, in order
+        """
+        n = len(self.points)
+        return self._to_dict(self.points, [results[j::n] for j in range(n)])
+
+    def _to_dict(self, points: [], results: [], errors: [] = None) -> dict:
+        """
+        :param results: for each point, the result of each series
+        :param errors: for each series, its estimated interpolation error if the curve was refined
+        """
+        series = []
+        for k, (test, data_series) in enumerate(self.series):
+            values = [point[k] for point in results]
+            s = dict(test=test.value,
+                     type_I_error=data_series.type_I_error,
+                     mean_scale_factor=data_series.mean_scale_factor,
+                     variance_scale_factor=data_series.variance_scale_factor,
+                     power=[_number(r.get('power')) for r in values],
+                     total_n=[_number(self._total_n(r)) for r in values],
+                     lower_bound=[_number(r.get('lower_bound')) for r in values],
+                     upper_bound=[_number(r.get('upper_bound')) for r in values],
+                     errors=[self._error(r) for r in values])
+            if errors is not None:
+                s['interpolation_error'] = errors[k]
+            series.append(s)
+        curve = dict(x_axis=self.x_axis.value, x=[self._x(t) for t in points], series=series)
+        if errors is not None:
+            curve['tolerance'] = self.tolerance
+        return curve
+
+    def _total_n(self, result: dict):
+        if self.study_design.solve_for == SolveFor.SAMPLESIZE:
+            return result.get('samplesize')
+        return result.get('model', {}).get('total_n')
+
+    def _error(self, result: dict):
+        """The error message for a point, or None if its power was calculated."""
+        value = result.get('samplesize') if self.study_design.solve_for == SolveFor.SAMPLESIZE else result.get('power')
+        if _number(value) is not None and _number(result.get('power')) is not None:
+            return None
+        if isinstance(value, str):
+            return value.strip()
+        errors = result.get('model', {}).get('errors')
+        return ' '.join(str(e) for e in errors) if errors else 'Not Calculated.'
+
+
+def _number(value):
+    """value if it is a calculated number, otherwise None. -1 marks a power which was not a number."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, np.number)):
+        return None
+    if not math.isfinite(value) or value < 0:
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _deviation(fa, fm, fb) -> float:
+    """
+    Distance of the value at the midpoint of an interval from the linear interpolation of the values at its ends.
+    Infinite if a series could only be calculated at some of the three points.
+    """
+    values = [fa, fm, fb]
+    if all(v is None for v in values):
+        return 0
+    if any(v is None for v in values):
+        return math.inf
+    return abs(fm - (fa + fb) / 2)
@@ -0,0 +1,424 @@
+from collections import OrderedDict
+
+import numpy as np
+from pyglimmpse import multirep, unirep
+from pyglimmpse.constants import Constants
+from pyglimmpse.exceptions.glimmpse_exception import GlimmpseValidationException
+from pyglimmpse.model.power import Power
+from scipy import special, stats
+
+# the tests which can be evaluated for a batch of models, and the unirep method of each univariate one
+_UNIREP_METHODS = {unirep.uncorrected: Constants.UN,
+                   unirep.box: Constants.BOX,
+                   unirep.geisser_greenhouse: Constants.GG,
+                   unirep.hyuhn_feldt: Constants.HF}
+_MULTIREP_TESTS = [multirep.special,
+                   multirep.hlt_two_moment_null_approximator_obrien_shieh,
+                   multirep.pbt_two_moment_null_approx_obrien_shieh,
+                   multirep.wlk_two_moment_null_approx_obrien_shieh]
+# optional arguments which change how power is calculated, and so are not supported
+_UNSUPPORTED_ARGS = ['noncentrality_distribution', 'quantile', 'confidence_interval', 'approximation_method',
+                     'epsilon_estimator']
+
+
+def supports(test, **kwargs) -> bool:
+    """Whether powers() calculates power in the same way as test would with these optional arguments."""
+    if test not in _MULTIREP_TESTS and test not in _UNIREP_METHODS:
+        return False
+    return not any(kwargs.get(arg) for arg in _UNSUPPORTED_ARGS)
+
+
+def powers(test,
+           rank_C: float,
+           rank_X: float,
+           relative_group_sizes,
+           rep_N,
+           alpha,
+           sigma_star: np.ndarray,
+           delta_es: np.ndarray,
+           tolerance=1e-12,
+           sigma_star_factor: np.ndarray = None) -> []:
+    """
+    Power for a batch of models of one design, as calculated by the pyglimmpse function test for each of them.
+
+    The models share C, X and their relative group sizes, and may differ in their test, N, alpha, delta and sigma
+    star. Each step of the calculation is done for the whole batch with array operations, including one scipy.stats
+    call for each distribution used. The eigenvalues every test uses are held in a Spectra, so models which differ
+    only in their test or alpha share one decomposition.
+
+    :param test: the test of every model, or a list with the test of each model
+    :param rep_N: per group N of each model
+    :param alpha: alpha of each model
+    :param sigma_star: sigma star of each model, stacked to shape (models, b, b)
+    :param delta_es: delta of each model, stacked to shape (models, b, b)
+    :param sigma_star_factor: the lower triangular Cholesky factor of the sigma star of each model, stacked as
+                              sigma_star, if already known. The error sum of squares is then factorised from it.
+    :return: a list with, for each model, the Power, the GlimmpseValidationException raised calculating it, or None
+             if it is not calculable in a batch and should be calculated with test.
+    """
+    rep_N = np.asarray(rep_N, dtype=float)
+    alpha = np.asarray(alpha, dtype=float)
+    sigma_star = np.asarray(sigma_star, dtype=float)
+    delta_es = np.asarray(delta_es, dtype=float)
+    if sigma_star_factor is not None:
+        sigma_star_factor = np.asarray(sigma_star_factor, dtype=float)
+    tests = test if isinstance(test, (list, tuple)) else [test] * len(rep_N)
+    results = [None] * len(rep_N)
+    try:
+        with np.errstate(all='ignore'):
+            spectra = Spectra(rank_X, relative_group_sizes, rep_N, sigma_star, delta_es, sigma_star_factor)
+            for t in OrderedDict.fromkeys(tests):
+                models = np.array([i for i, model_test in enumerate(tests) if model_test is t])
+                index = spectra.index[models]
+                if t in _UNIREP_METHODS:
+                    calculated = _unirep(_UNIREP_METHODS[t], rank_C, rank_X, spectra, index, alpha[models])
+                else:
+                    calculated = _MULTIREP_POWERS[t](rank_C, rank_X, spectra, index, alpha[models], tolerance)
+                for i, power in zip(models, calculated):
+                    results[i] = power
+    except np.linalg.LinAlgError:
+        return [None] * len(rep_N)
+    return results
+
+
+class Spectra(object):
+    """
+    The sums of squares of a batch of models and the eigenvalues calculated from them, held once for each distinct
+    (N, sigma star, delta) in the batch. The eigenvalues of H INV(E) and of sigma star are each decomposed for the
+    whole batch the first time a test needs them.
+    """
+
+    def __init__(self, rank_X, relative_group_sizes, rep_N, sigma_star, delta_es, sigma_star_factor=None):
+        """
+        :param rep_N: per group N of each model
+        :param sigma_star: sigma star of each model, stacked to shape (models, b, b)
+        :param delta_es: delta of each model, stacked to shape (models, b, b)
+        :param sigma_star_factor: the lower triangular Cholesky factor of each sigma star, stacked as sigma_star, or
+                                  None to factorise the error sums of squares
+        """
+        rows = OrderedDict()
+        #: the row of the spectra of each model
+        self.index = np.array([rows.setdefault((n, s.tobytes(), d.tobytes()), len(rows))
+                               for n, s, d in zip(rep_N, sigma_star, delta_es)], dtype=int)
+        first = np.unique(self.index, return_index=True)[1]
+        self.rep_N = rep_N[first]
+        self.sigma_star = sigma_star[first]
+        self.delta_es = delta_es[first]
+        self.sigma_star_factor = None if sigma_star_factor is None else sigma_star_factor[first]
+        # pyglimmpse.multirep.calc_properties
+        self.rank_U = sigma_star.shape[-1]
+        self.rank_X = rank_X
+        self.total_N = self.rep_N * sum(relative_group_sizes) * 1.0
+        self.error_sum_square = (self.total_N - rank_X)[:, np.newaxis, np.newaxis] * self.sigma_star
+        self.hypothesis_sum_square = self.rep_N[:, np.newaxis, np.newaxis] * self.delta_es
+        self._eval_HINVE = None
+        self._sigma_eigenvalues = None
+
+    @property
+    def definite(self) -> np.ndarray:
+        """Whether the eigenvalues of H INV(E) of each row were calculated, its error sum of squares being positive
+        definite."""
+        return ~np.isnan(self.eval_HINVE[:, 0])
+
+    @property
+    def eval_HINVE(self) -> np.ndarray:
+        """
+        pyglimmpse.multirep._calc_eval: the eigenvalues of H INV(E), largest first, for each row. Not a number where
+        the error sum of squares is not positive definite.
+        """
+        if self._eval_HINVE is None:
+            if self.sigma_star_factor is None:
+                definite = np.array([_is_positive_definite(e) for e in self.error_sum_square], dtype=bool)
+            else:
+                # sigma star being positive definite, (N - rank X) sigma star is whenever N - rank X is positive
+                nu_e = self.total_N - self.rank_X
+                definite = nu_e > 0
+            self._eval_HINVE = np.full((len(self.rep_N), self.rank_U), np.nan)
+            if np.any(definite):
+                if self.sigma_star_factor is None:
+                    error_sum_factor = np.linalg.cholesky(self.error_sum_square[definite])
+                else:
+                    # the factor of (N - rank X) sigma star is sqrt(N - rank X) L
+                    error_sum_factor = (np.sqrt(nu_e[definite])[:, np.newaxis, np.newaxis]
+                                        * self.sigma_star_factor[definite])
+                inverse_error_sum = np.linalg.inv(error_sum_factor)
+                hypothesis_sum_square = self.hypothesis_sum_square[definite]
+                hei_orth = inverse_error_sum @ hypothesis_sum_square @ np.swapaxes(inverse_error_sum, -1, -2)
+                hei_orth_symm = (hei_orth + np.swapaxes(hei_orth, -1, -2)) / 2
+                self._eval_HINVE[definite] = np.linalg.svd(hei_orth_symm, compute_uv=False, hermitian=True)
+        return self._eval_HINVE
+
+    @property
+    def sigma_eigenvalues(self) -> np.ndarray:
+        """pyglimmpse.model.epsilon.Epsilon: the eigenvalues of sigma star scaled to have trace one, for each row."""
+        if self._sigma_eigenvalues is None:
+            esig = self.sigma_star / np.trace(self.sigma_star, axis1=1, axis2=2)[:, np.newaxis, np.newaxis]
+            self._sigma_eigenvalues = np.linalg.svd(esig, compute_uv=False, hermitian=True)
+        return self._sigma_eigenvalues
+
+
+def _is_positive_definite(matrix) -> bool:
+    try:
+        np.linalg.cholesky(matrix)
+        return True
+    except np.linalg.LinAlgError:
+        return False
+
+
+def _special(rank_C, rank_X, spectra: Spectra, index, alpha, tolerance):
+    """pyglimmpse.multirep.special"""
+    rank_U = spectra.rank_U
+    total_N = spectra.total_N[index]
+    df1 = np.full(len(index), float(rank_C * rank_U))
+    df2 = total_N - rank_X - rank_U + 1
+    eval_HINVE = spectra.eval_HINVE[index, 0:min(rank_C, rank_U)]
+    # power is undefined if the error sum of squares is not positive definite
+    valid = spectra.definite[index] & (df2 > tolerance) & ~np.isnan(df2)
+
+    omega = eval_HINVE[:, 0] * (total_N - rank_X)
+    return _multi_powers(alpha, df1, df2, omega, valid)
+
+
+def _hlt_two_moment_obrien_shieh(rank_C, rank_X, spectra: Spectra, index, alpha, tolerance):
+    """pyglimmpse.multirep.hlt_two_moment_null_approximator_obrien_shieh"""
+    rank_U = spectra.rank_U
+    total_N = spectra.total_N[index]
+    df1 = np.full(len(index), float(rank_C * rank_U))
+    nu_e = total_N - rank_X
+    df2_denominator = nu_e * (rank_C + rank_U + 1) - (rank_C + 2 * rank_U + rank_U * rank_U - 1)
+    df2 = nu_e * nu_e - nu_e * (2 * rank_U + 3) + rank_U * (rank_U + 3)
+    df2 = df2 / df2_denominator
+    df2 = 4 + (rank_C * rank_U + 2) * df2
+    eval_HINVE = spectra.eval_HINVE[index, 0:min(rank_C, rank_U)]
+    valid = (df2 > tolerance) & ~np.isnan(df2) & ~np.isnan(eval_HINVE[:, 0])
+
+    # pyglimmpse.multirep._calc_omega
+    hlt = np.sum(eval_HINVE, axis=1) * (total_N - rank_X) / total_N
+    omega = (total_N * min(rank_C, rank_U)) * (hlt / min(rank_C, rank_U))
+    # pyglimmpse raises an error dividing by zero, or where the eigenvalues cannot be calculated
+    raises = (df2_denominator == 0) | ~spectra.definite[index]
+    return _multi_powers(alpha, df1, df2, omega, valid, raises=raises)
+
+
+def _pbt_two_moment_obrien_shieh(rank_C, rank_X, spectra: Spectra, index, alpha, tolerance):
+    """pyglimmpse.multirep.pbt_two_moment_null_approx_obrien_shieh"""
+    rank_U = spectra.rank_U
+    min_rank_C_U = min(rank_C, rank_U)
+    total_N = spectra.total_N[index]
+    # pyglimmpse.multirep._pbt_two_moment_df1_df2
+    mu1 = rank_C * rank_U / (total_N - rank_X + rank_C)
+    factor1 = (total_N - rank_X + rank_C - rank_U) / (total_N - rank_X + rank_C - 1)
+    factor2 = (total_N - rank_X) / (total_N - rank_X + rank_C + 2)
+    variance = 2 * rank_C * rank_U * factor1 * factor2 / (total_N - rank_X + rank_C) ** 2
+    mu2 = variance + mu1 ** 2
+    m1 = mu1 / min_rank_C_U
+    m2 = mu2 / (min_rank_C_U * min_rank_C_U)
+    denom = m2 - m1 * m1
+    df1 = 2 * m1 * (m1 - m2) / denom
+    df2 = 2 * (m1 - m2) * (1 - m1) / denom
+    eval_HINVE = spectra.eval_HINVE[index, 0:min_rank_C_U]
+    valid = (df2 > tolerance) & ~np.isnan(df2) & ~np.isnan(eval_HINVE[:, 0])
+
+    evalt = eval_HINVE * (total_N - rank_X)[:, np.newaxis] / total_N[:, np.newaxis]
+    v = np.sum(evalt / (1 + evalt), axis=1)
+    calculable = (min_rank_C_U - v) > tolerance
+    omega = total_N * min_rank_C_U * v / (min_rank_C_U - v)
+    # pyglimmpse raises an error dividing by zero, or where the eigenvalues cannot be calculated
+    raises = ((total_N - rank_X + rank_C == 0) | (total_N - rank_X + rank_C - 1 == 0)
+              | (total_N - rank_X + rank_C + 2 == 0) | (denom == 0) | ~spectra.definite[index])
+    results = _multi_powers(alpha, df1, df2, omega, valid & calculable, raises=raises)
+    for i in range(len(index)):
+        if raises[i]:
+            continue
+        if not valid[i]:
+            results[i] = Power(float('nan'), float('nan'), Constants.FMETHOD_MISSING,
+                               'Power is missing because df2 or eval_HINVE is not valid.')
+        elif not calculable[i] and valid[i]:
+            results[i] = Power(float('nan'), float('nan'), Constants.FMETHOD_MISSING,
+                               'Power is missing because because the min_rank_C_U - v  <= 0.')
+    return results
+
+
+def _wlk_two_moment_obrien_shieh(rank_C, rank_X, spectra: Spectra, index, alpha, tolerance):
+    """pyglimmpse.multirep.wlk_two_moment_null_approx_obrien_shieh"""
+    rank_U = spectra.rank_U
+    min_rank_C_U = min(rank_C, rank_U)
+    total_N = spectra.total_N[index]
+    df1 = np.full(len(index), float(rank_C * rank_U))
+    eval_HINVE = spectra.eval_HINVE[index, 0:min_rank_C_U]
+    w = np.exp(np.sum(-np.log(1 + eval_HINVE * (total_N - rank_X)[:, np.newaxis] / total_N[:, np.newaxis]), axis=1))
+    if min_rank_C_U == 1:
+        df2 = total_N - rank_X - rank_U + 1
+        rs = 1
+        tempw = w
+    else:
+        rm = total_N - rank_X - (rank_U - rank_C + 1) / 2
+        rs = np.sqrt((rank_C * rank_C * rank_U * rank_U - 4) / (rank_C * rank_C + rank_U * rank_U - 5))
+        r1 = (rank_U * rank_C - 2) / 4
+        tempw = np.power(w, 1 / rs)
+        df2 = (rm * rs) - 2 * r1
+    omega = (total_N * rs) * (1 - tempw) / tempw
+    valid = ~((df2 <= tolerance) | np.isnan(w) | np.isnan(omega))
+    # pyglimmpse fails where the eigenvalues are not a number, so those models are left to it
+    return _multi_powers(alpha, df1, df2, omega, valid, raises=np.isnan(eval_HINVE[:, 0]))
+
+
+def _multi_powers(alpha, df1, df2, omega, valid, raises=None) -> []:
+    """
+    pyglimmpse.multirep._multi_power for the models where valid, and undefined power for the others.
+
+    :param raises: the models for which pyglimmpse raises an error, which are left to it
+    """
+    fcrit = _finv(1 - alpha, df1, df2)
+    prob, fmethod = _probf(fcrit, df1, df2, omega)
+    power = np.where((fmethod == Constants.FMETHOD_NORMAL_LR) & (prob == 1), alpha, 1 - prob)
+
+    results = []
+    for i in range(len(alpha)):
+        if raises is not None and raises[i]:
+            results.append(None)
+        elif not valid[i]:
+            results.append(Power(float('nan'), float('nan'), Constants.FMETHOD_MISSING, None))
+        elif fmethod[i] is None:
+            results.append(None)
+        else:
+            results.append(Power(float(power[i]), omega[i], fmethod[i]))
+    return results
+
+
+_MULTIREP_POWERS = {multirep.special: _special,
+                    multirep.hlt_two_moment_null_approximator_obrien_shieh: _hlt_two_moment_obrien_shieh,
+                    multirep.pbt_two_moment_null_approx_obrien_shieh: _pbt_two_moment_obrien_shieh,
+                    multirep.wlk_two_moment_null_approx_obrien_shieh: _wlk_two_moment_obrien_shieh}
+
+
+def _unirep(unirep_method, rank_C, rank_X, spectra: Spectra, index, alpha):
+    """pyglimmpse.unirep._unirep_power with sigma known and the default approximations."""
+    rank_U = spectra.rank_U
+    total_N = spectra.total_N[index]
+    sigma_star = spectra.sigma_star[index]
+    hypothesis_sum_square = spectra.hypothesis_sum_square[index]
+    seigval = spectra.sigma_eigenvalues[index]
+    slam1 = np.sum(seigval, axis=1) ** 2
+    slam2 = np.sum(np.square(seigval), axis=1)
+    eps = slam1 / (rank_U * slam2)
+
+    nue = total_N - rank_X
+    expected_epsilon = _expected_epsilon(unirep_method, rank_U, nue, slam1, slam2)
+    undefined = np.isnan(expected_epsilon) | (nue <= 0)
+    undf1 = rank_C * rank_U
+    undf2 = rank_U * nue
+
+    # pyglimmpse.model.hypothesis_error.HypothesisError
+    q1 = np.trace(sigma_star, axis1=1, axis2=2)
+    q2 = np.trace(hypothesis_sum_square, axis1=1, axis2=2)
+    q3 = q1 ** 2
+    q4 = np.sum(np.power(sigma_star, 2), axis=(1, 2))
+    q5 = np.trace(sigma_star @ hypothesis_sum_square, axis1=1, axis2=2)
+    lambar = q1 / rank_U
+
+    # pyglimmpse.unirep._calc_multipliers_known_sigma, with the Muller, Edwards and Taylor (2004) approximation
+    epsn_num = q3 + q1 * q2 * 2 / rank_C
+    epsn_den = q4 + q5 * 2 / rank_C
+    e_3_5 = epsn_num / (rank_U * epsn_den)
+    e_4 = eps
+    e_1_2 = np.clip(expected_epsilon, 1 / rank_U, 1)
+    omega = e_3_5 * q2 / lambar
+
+    fcrit = _finv(1 - alpha, undf1 * e_1_2, undf2 * e_1_2)
+    prob, fmethod = _probf(fcrit, undf1 * e_3_5, undf2 * e_4, omega)
+    power = np.where((fmethod == Constants.FMETHOD_NORMAL_LR) & (prob == 1), alpha, 1 - prob)
+
+    results = []
+    for i in range(len(index)):
+        if undefined[i]:
+            results.append(GlimmpseValidationException(Constants.ERR_ERROR_DEG_FREEDOM.value))
+        elif fmethod[i] is None:
+            results.append(None)
+        else:
+            results.append(Power(power[i], omega[i], Constants.SIGMA_KNOWN))
+    return results
+
+
+def _expected_epsilon(unirep_method, rank_U, nue, slam1, slam2):
+    """The expected value of the epsilon estimator, with the Muller, Edwards, Simpson and Taylor (2007) approximators."""
+    if unirep_method == Constants.UN:
+        return np.ones(len(nue))
+    if unirep_method == Constants.BOX:
+        return np.full(len(nue), 1 / rank_U)
+    # Epsilon.esigEvals() is the square of the sum of the eigenvalues
+    expt1 = 2 * nue * slam2 + nue ** 2 * slam1
+    expt2 = nue * (nue + 1) * slam2 + nue * slam1
+    if unirep_method == Constants.GG:
+        return (1 / rank_U) * (expt1 / expt2)
+    num01 = (1 / rank_U) * ((nue + 1) * expt1 - 2 * expt2)
+    den01 = nue * expt2 - expt1
+    # for valid error degrees of freedom, nu must be strictly greater than 4
+    return np.where(nue < 4, np.nan, num01 / den01)
+
+
+def _finv(alpha, df1, df2):
+    """pyglimmpse.finv.finv, for arrays."""
+    fcrit = np.full(np.shape(df1), np.nan)
+    defined = ~((df1 > 10**7.6) | (df1 < 0) | (df2 < 0))
+    f = defined & ~(df2 > 10**9.4)
+    chi2 = defined & (df2 > 10**9.4)
+    if np.any(f):
+        fcrit[f] = stats.f.ppf(alpha[f], df1[f], df2[f])
+    if np.any(chi2):
+        fcrit[chi2] = stats.chi2.ppf(alpha[chi2], df1[chi2])
+    return fcrit
+
+
+def _probf(fcrit, df1, df2, noncen):
+    """
+    pyglimmpse.probf.probf, for arrays.
+
+    :return: prob and fmethod arrays. fmethod is None where pyglimmpse would not calculate prob.
+    """
+    prob = np.full(np.shape(fcrit), np.nan)
+    fmethod = np.full(np.shape(fcrit), None, dtype=object)
+    cdf = (((df1 < 10**4.4) & (df2 < 10**5.4) & (noncen < 10**6.4))
+           | ((df1 < 10**6) & (df2 < 10) & (noncen < 10**6)))
+    tiku = ~cdf & (1 <= df1) & (df1 < 10**9.2) & (10**0.6 <= df2) & (df2 < 10**9.2) & (noncen < 10**6.4)
+    chi2 = ~cdf & ~tiku & (df2 > 10**9.4)
+    normal = ~cdf & ~tiku & ~chi2
+
+    if np.any(cdf):
+        prob[cdf] = special.ncfdtr(df1[cdf], df2[cdf], noncen[cdf], fcrit[cdf])
+        fmethod[cdf] = Constants.FMETHOD_NOAPPROXIMATION
+    if np.any(tiku):
+        d1, d2, nc = df1[tiku], df2[tiku], noncen[tiku]
+        h_tiku = 2 * (d1 + nc)**3 + 3 * (d1 + nc) * (d1 + 2 * nc) * (d2 - 2) + (d1 + 3 * nc) * (d2 - 2)**2
+        k_tiku = (d1 + nc)**2 + (d2 - 2) * (d1 + 2 * nc)
+        df1_tiku = np.floor(0.5 * (d2 - 2) * ((h_tiku**2 / (h_tiku**2 - 4 * k_tiku**3))**0.5 - 1))
+        c_tiku = (df1_tiku / d1) / (2 * df1_tiku + d2 - 2) * (h_tiku / k_tiku)
+        b_tiku = - d2 / (d2 - 2) * (c_tiku - 1 - nc / d1)
+        fcrit_tiku = (fcrit[tiku] - b_tiku) / c_tiku
+        prob[tiku] = special.ncfdtr(df1_tiku, d2, 0, fcrit_tiku)
+        fmethod[tiku] = Constants.FMETHOD_TIKU
+    if np.any(chi2):
+        prob[chi2] = stats.ncx2.cdf(x=fcrit[chi2], df=df1[chi2], nc=noncen[chi2])
+        fmethod[chi2] = Constants.FMETHOD_CHI2
+    if np.any(normal):
+        zscore = _zscore(df1[normal], df2[normal], fcrit[normal], noncen[normal])
+        small = np.abs(zscore) < 6
+        normal_prob = np.where(zscore < -6, 0.0, 1.0)
+        normal_prob[small] = stats.norm.cdf(zscore[small])
+        normal_fmethod = np.full(np.shape(zscore), Constants.FMETHOD_NORMAL_LR, dtype=object)
+        normal_fmethod[small] = Constants.FMETHOD_NORMAL_SM
+        # pyglimmpse does not calculate prob for a z score which is not a number
+        normal_fmethod[np.isnan(zscore)] = None
+        prob[normal] = normal_prob
+        fmethod[normal] = normal_fmethod
+    return prob, fmethod
+
+
+def _zscore(df1, df2, fcrit, noncen):
+    """pyglimmpse.probf._get_zscore"""
+    arg1 = ((df1 * fcrit) / (df1 + noncen))
+    arg2 = (2 / 9) * (df1 + 2 * noncen) * ((df1 + noncen) ** -2)
+    arg3 = (2 / 9) * (1 / df2)
+    numz = (arg1 ** (1 / 3)) - (arg3 * (arg1 ** (1 / 3))) - (1 - arg2)
+    denz = (arg2 + arg3 * arg1 ** (2 / 3)) ** (1 / 2)
+    return numz / denz
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache(object):
+    """
+    Bounded least recently used cache, with a time to live, for calculated results.
+
+    Keys are content addressed fingerprints of a model's StudyDesign and ScenarioInputs, so an entry can never be
+    stale in the sense of holding the wrong result. The time to live only bounds how long memory is held.
+    Cached values are shared between requests and must not be modified.
+    """
+
+    def __init__(self,
+                 max_size: int = 1024,
+                 ttl: float = 3600,
+                 clock=time.monotonic):
+        """
+        :param max_size: maximum number of entries. 0 disables the cache.
+        :param ttl: seconds an entry is kept after it was stored
+        :param clock: function returning the current time in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value stored for key, or None if there is no live entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored, value = entry
+            if self.clock() - stored > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store value for key, evicting the least recently used entries if the cache is full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(size=len(self._entries),
+                        max_size=self.max_size,
+                        ttl=self.ttl,
+                        hits=self.hits,
+                        misses=self.misses,
+                        evictions=self.evictions,
+                        expirations=self.expirations)
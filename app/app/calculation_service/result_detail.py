@@ -0,0 +1,58 @@
+import numpy as np
+
+from app.calculation_service.model.enums import Detail
+
+# the fields of LinearModel.to_dict which hold a serialised matrix
+MATRIX_FIELDS = ('essence_design_matrix', 'hypothesis_beta', 'c_matrix', 'u_matrix', 'sigma_star_outcome_component',
+                 'sigma_star_repeated_measure_component', 'sigma_star_cluster_component',
+                 'sigma_star_gaussian_adjustment', 'sigma_star', 'theta_zero', 'theta', 'm', 'hypothesis_sum_square',
+                 'error_sum_square', 'delta')
+
+# the fields of LinearModel.to_dict kept in a lean result: its errors and the inputs identifying it
+LEAN_FIELDS = ('errors', 'test', 'alpha', 'target_power', 'smallest_group_size', 'total_n', 'means_scale_factor',
+               'variance_scale_factor', 'power_method', 'quantile', 'confidence_interval')
+
+
+class MatrixTable(object):
+    """
+    Each distinct matrix of a response, once. Matrices are compared by value, arrays by their dtype, shape and
+    contents and other matrices, such as the lists of results read back from a job, by their repr. Each is referred
+    to by its position in the table.
+    """
+
+    def __init__(self):
+        self.matrices = []
+        self._ids = {}
+
+    def add(self, matrix) -> int:
+        """The id of matrix, adding it to the table if it is not already in it."""
+        if isinstance(matrix, np.ndarray) and matrix.dtype != object:
+            key = (str(matrix.dtype), matrix.shape, np.ascontiguousarray(matrix).tobytes())
+        else:
+            key = repr(matrix)
+        if key not in self._ids:
+            self._ids[key] = len(self.matrices)
+            self.matrices.append(matrix)
+        return self._ids[key]
+
+
+def shape(result, detail: Detail, table: MatrixTable = None):
+    """
+    A result as returned at a level of detail. The result itself is not changed, as it may be shared by several rows
+    and by the result cache.
+
+    full returns the result. lean returns the result with only the LEAN_FIELDS of its model. shared returns the
+    result with the matrices of its model replaced by their ids in table.
+    """
+    if detail == Detail.FULL or not isinstance(result, dict) or not isinstance(result.get('model'), dict):
+        return result
+    shaped = dict(result)
+    if detail == Detail.SHARED:
+        model = dict(result['model'])
+        for field in MATRIX_FIELDS:
+            if model.get(field) is not None:
+                model[field] = table.add(model[field])
+    else:
+        model = {field: value for field, value in result['model'].items() if field in LEAN_FIELDS}
+    shaped['model'] = model
+    return shaped
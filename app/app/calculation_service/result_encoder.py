@@ -0,0 +1,45 @@
+import json
+import math
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# power, lower_bound and upper_bound of a result which were not a number
+NOT_A_NUMBER = -1
+
+
+def dumps(obj) -> bytes:
+    """
+    obj as UTF-8 encoded JSON.
+
+    Results hold their matrices as ndarrays. With orjson installed these are written straight from their buffers,
+    otherwise they are converted to lists for json. Either way a non-finite entry of an array is written as null.
+    orjson also writes any other non-finite float as null, json as NaN or Infinity, so the numbers of a result
+    should be passed through finite first.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default).encode('utf-8')
+
+
+def finite(value):
+    """value, or NOT_A_NUMBER if it is a non-finite number."""
+    if isinstance(value, (float, np.floating)) and not math.isfinite(value):
+        return NOT_A_NUMBER
+    return value
+
+
+def _default(obj):
+    """The arrays and scalars orjson does not write itself, such as non-contiguous or object arrays, as lists."""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == 'f' and not np.isfinite(obj).all():
+            obj = np.where(np.isfinite(obj), obj, None)
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        value = obj.item()
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+    raise TypeError('Object of type {0} is not JSON serializable'.format(type(obj).__name__))
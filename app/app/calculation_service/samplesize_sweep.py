@@ -0,0 +1,157 @@
+import math
+import sys
+
+import numpy as np
+from pyglimmpse import samplesize
+from pyglimmpse.constants import Constants
+from pyglimmpse.exceptions.glimmpse_exception import GlimmpseValidationException
+from pyglimmpse.model.power import Power
+
+
+class _PowerSequence(object):
+    """
+    Power for one model at any per group N, each N being evaluated at most once.
+
+    As in pyglimmpse.samplesize, power is evaluated without the optional arguments while the search for an upper
+    bound doubles N, and with them while bisecting.
+    """
+
+    def __init__(self, test, rank_C, rank_X, relative_group_sizes, alpha, sigma_star, delta_es, **kwargs):
+        self.test = test
+        self.args = dict(rank_C=rank_C,
+                         rank_X=rank_X,
+                         relative_group_sizes=relative_group_sizes,
+                         alpha=alpha,
+                         sigma_star=sigma_star,
+                         delta_es=delta_es)
+        self.kwargs = kwargs
+        self.evaluations = 0
+        self._powers = dict()
+
+    def power(self, rep_N, optional_args: bool = False) -> Power:
+        key = (rep_N, optional_args)
+        if key not in self._powers:
+            self.evaluations += 1
+            try:
+                if optional_args:
+                    self._powers[key] = self.test(rep_N=rep_N, **self.args, **self.kwargs)
+                else:
+                    self._powers[key] = self.test(rep_N=rep_N, **self.args)
+            except Exception as e:
+                self._powers[key] = e
+        power = self._powers[key]
+        if isinstance(power, Exception):
+            raise power
+        return power
+
+
+def samplesizes(test,
+                rank_C: float,
+                rank_X: float,
+                relative_group_sizes,
+                alpha: float,
+                sigma_star: np.ndarray,
+                delta_es: np.ndarray,
+                target_powers: [],
+                starting_smallest_group_size=Constants.STARTING_SAMPLE_SIZE.value,
+                **kwargs) -> []:
+    """
+    Smallest realizable sample size for each of several target powers of one model.
+
+    This finds the same sample sizes as calling pyglimmpse.samplesize.samplesize once per target power, but power
+    is evaluated only once for each N, so the searches for later targets reuse the evaluations of earlier ones.
+    Because power is monotone in N, the bisection for the smallest N is done over integer N.
+
+    :return: a list with, for each target power, either (total_N, Power) or the ValueError raised by the search.
+    """
+    powers = _PowerSequence(test, rank_C, rank_X, relative_group_sizes, alpha, sigma_star, delta_es, **kwargs)
+    results = []
+    for target_power in target_powers:
+        try:
+            results.append(_samplesize(powers, target_power, starting_smallest_group_size))
+        except ValueError as e:
+            results.append(e)
+    return results
+
+
+def _samplesize(powers: _PowerSequence, target_power, starting_smallest_group_size):
+    """pyglimmpse.samplesize.samplesize, evaluating power through powers."""
+    relative_group_sizes = powers.args['relative_group_sizes']
+    max_n = min(sys.maxsize/powers.args['rank_X'], Constants.MAX_SAMPLE_SIZE.value)
+    upper_power = Power()
+    lowest_realizeable_power = Power()
+    lowest_realizeable_total_N = 0
+    upper_bound_smallest_group_size = starting_smallest_group_size
+    upper_bound_total_N = upper_bound_smallest_group_size * sum(relative_group_sizes)
+    smallest_design_found = False
+
+    # find a samplesize which produces power greater than or equal to the desired power
+    while (np.isnan(upper_power.power) or upper_power.power <= target_power) and upper_bound_total_N < max_n:
+        upper_bound_total_N = upper_bound_smallest_group_size * sum(relative_group_sizes)
+        if upper_bound_total_N >= max_n:
+            upper_bound_smallest_group_size = upper_bound_total_N/max_n
+        try:
+            upper_power = powers.power(upper_bound_smallest_group_size)
+            if type(upper_power.power) is str:
+                raise ValueError('Upper power is not calculable. Check that your design is realisable.'
+                                 ' Usually the easies way to do this is to increase sample size')
+        except GlimmpseValidationException:
+            pass
+        upper_bound_smallest_group_size += upper_bound_smallest_group_size
+        if not np.isnan(upper_power.power) and not smallest_design_found:
+            lowest_realizeable_power = upper_power
+            lowest_realizeable_total_N = upper_bound_total_N
+            smallest_design_found = True
+
+    if lowest_realizeable_power.power >= target_power:
+        return lowest_realizeable_total_N, lowest_realizeable_power
+
+    if upper_power.power is None or math.isnan(upper_power.power):
+        raise ValueError('Could not find a samplesize which achieves the target power. Please check your design.')
+
+    # undo the last doubling. The lower bound is half the upper bound, using floor division.
+    upper_bound_smallest_group_size = upper_bound_smallest_group_size / 2
+    lower_bound_smallest_group_size = upper_bound_smallest_group_size // 2
+    lower_power = powers.power(lower_bound_smallest_group_size)
+    if lower_power.power >= target_power:
+        return lower_bound_smallest_group_size * sum(relative_group_sizes), lower_power
+
+    per_group_n = _bisect(powers, target_power, lower_bound_smallest_group_size, upper_bound_smallest_group_size)
+    if per_group_n is None:
+        # power is not a number somewhere between the bounds, so leave the search to pyglimmpse
+        return samplesize.samplesize(test=powers.test,
+                                     targetPower=target_power,
+                                     starting_smallest_group_size=starting_smallest_group_size,
+                                     **powers.args,
+                                     **powers.kwargs)
+    power = powers.power(per_group_n, optional_args=True)
+    if power.power < target_power:
+        raise ValueError('Samplesize cannot be calculated. Please check your design.')
+    total_N = sum([math.ceil(per_group_n) * g for g in relative_group_sizes])
+    return total_N, power
+
+
+def _bisect(powers: _PowerSequence, target_power, lower, upper):
+    """
+    The smallest integer per group N in [lower, upper] with power of at least target_power, or None if power is
+    not a number at one of the N evaluated.
+    """
+    f = lambda n: powers.power(n, optional_args=True).power - target_power
+    f_lower, f_upper = f(lower), f(upper)
+    if np.isnan(f_lower) or np.isnan(f_upper):
+        return None
+    if f_lower * f_upper > 0:
+        raise ValueError('f(a) and f(b) must have different signs')
+    if f_lower == 0:
+        return int(lower)
+    lower, upper = int(lower), int(math.ceil(upper))
+    while upper - lower > 1:
+        middle = (lower + upper) // 2
+        f_middle = f(middle)
+        if np.isnan(f_middle):
+            return None
+        if f_middle >= 0:
+            upper = middle
+        else:
+            lower = middle
+    return upper
@@ -376,7 +376,7 @@ def get_inputs(V3_JSON, file_path):
     scenario = StudyDesign().load_from_json(data)
     models = _generate_models(scenario, i)
     model = models[0]
-    list_inputs["_essenceX"] = "Es(\\mathbf{X}) = " + array_to_matrix(model.essence_design_matrix)
+    list_inputs["_essenceX"] = "Es(\\mathbf{X}) = " + array_to_matrix(model.get_dense_essence_design_matrix())
     list_inputs["_B"] = "\\mathbf{B} = " + array_to_matrix(model.hypothesis_beta)
     list_inputs["_C"] = "\\mathbf{C} = " + array_to_matrix(model.c_matrix)
     list_inputs["_U"] = "\\mathbf{U} = " + array_to_matrix(model.u_matrix)
@@ -0,0 +1,113 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+from pyglimmpse.model.power import Power
+
+from flask import Flask
+
+from app.calculation_service import api, result_encoder
+from app.calculation_service.model.linear_model import LinearModel
+from app.calculation_service.model.enums import Tests
+from app.calculation_service.model.scenario_inputs import ScenarioGrid, ScenarioInputs
+from app.calculation_service.model.study_design import StudyDesign
+from app.constants import Constants
+
+
+class CalculateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.register_blueprint(api.bp)
+        self.client = self.app.test_client()
+
+    def load(self, name):
+        with open(os.path.join(os.path.dirname(__file__), 'testInputs', name)) as f:
+            return json.load(f)
+
+    def test_echoed_inputs(self):
+        """Should return the inputs of each row with the result shared by the rows calculated the same way"""
+        d = self.load('Test01_V3_ConditionalTwoSampleTTest.json')
+        d.update(_scaleFactor=[1], _varianceScaleFactors=[1], _quantiles=[0.25, 0.5, 0.75])
+        results = json.loads(self.client.post('/api/calculate', data=json.dumps(d)).data)['results']
+        self.assertEqual([0.25, 0.5, 0.75], [r['model']['quantile'] for r in results])
+        self.assertEqual(['conditional'] * 3, [r['model']['power_method'] for r in results])
+        self.assertEqual(1, len(set(r['power'] for r in results)))
+
+    def test_repeated_in_later_chunks(self):
+        """Should calculate inputs repeated in a later chunk once, without the result cache"""
+        self.app.config.update(RESULT_CACHE_SIZE=0, CALCULATION_CHUNK_SIZE=1)
+        d = self.load('Test01_V3_ConditionalTwoSampleTTest.json')
+        d.update(_scaleFactor=[1], _varianceScaleFactors=[1], _quantiles=[0.25, 0.5, 0.75])
+        with mock.patch.object(api, '_generate_models', wraps=api._generate_models) as generate_models:
+            results = json.loads(self.client.post('/api/calculate', data=json.dumps(d)).data)['results']
+        self.assertEqual(3, len(results))
+        self.assertEqual(1, generate_models.call_count)
+
+    def test_orthonormalize_u_matrix_of_grid(self):
+        """Should find the tests of a grid of inputs from its tests axis, without generating the inputs"""
+        d = self.load('Test01_V3_ConditionalTwoSampleTTest.json')
+        study_design = StudyDesign().load_from_dict(d)
+        grid = ScenarioInputs().grid_from_dict(d, study_design.isu_factors)
+        expected = api.get_orthonormalize_u_matrix(study_design, list(grid))
+        with mock.patch.object(ScenarioGrid, '__iter__', side_effect=AssertionError('expanded')):
+            self.assertEqual(expected, api.get_orthonormalize_u_matrix(study_design, grid))
+
+    def test_group_models(self):
+        """Should split the models calculated in a batch between the processes, keeping those which share their
+        eigenvalues together"""
+        d = self.load('Test01_V3_ConditionalTwoSampleTTest.json')
+        d.update(_scaleFactor=[1, 2, 3], _varianceScaleFactors=[1])
+        study_design = StudyDesign().load_from_dict(d)
+        inputs = list(ScenarioInputs().grid_from_dict(d, study_design.isu_factors)) * 2
+        models = api._generate_models(study_design, inputs)
+        self.assertEqual(1, len(api._group_models(study_design, inputs, range(len(inputs)), models)))
+        groups = api._group_models(study_design, inputs, range(len(inputs)), models, processes=2)
+        self.assertEqual([[0, 2, 3, 5], [1, 4]], [[index for index, model in group] for group in groups])
+
+    def test_stream_shared(self):
+        """Should stream the matrices of a shared result keyed by their ids as strings"""
+        d = self.load('Test01_V3_ConditionalTwoSampleTTest.json')
+        d.update(_scaleFactor=[1, 2], _varianceScaleFactors=[1])
+        response = self.client.post('/api/calculate/stream?detail=shared', data=json.dumps(d))
+        lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        ids = [key for line in lines for key in line.get('matrices', {})]
+        self.assertEqual([str(i) for i in range(len(ids))], ids)
+        sigma_star = [line['result']['model']['sigma_star'] for line in lines]
+        self.assertEqual(sigma_star[0], sigma_star[1])
+
+    def test_for_inputs(self):
+        """Should set the echoed inputs changed by normalising back to those of the row, in a copy"""
+        inputs = ScenarioInputs(alpha=0.05, test=Tests.UNCORRECTED, power_method='conditional')
+        normalised = inputs.normalised(gaussian_covariate=True)
+        result = dict(power=0.8, model=dict(alpha=0.05, power_method=normalised.power_method, quantile=None))
+        actual = api._for_inputs(result, inputs, normalised)
+        self.assertEqual(dict(power=0.8, model=dict(alpha=0.05, power_method='conditional', quantile=None)), actual)
+        self.assertEqual('unconditional', result['model']['power_method'])
+        self.assertIs(result, api._for_inputs(result, normalised, normalised))
+
+    def test_samplesize_not_a_number(self):
+        """Should report the power of a samplesize which is not a number as -1, as for power"""
+        model = LinearModel(test=Tests.UNCORRECTED)
+        actual = api._samplesize_to_dict(model, 10, Power(power=float('nan')))
+        self.assertEqual(result_encoder.NOT_A_NUMBER, actual['power'])
+        self.assertEqual(10, actual['samplesize'])
+
+    def test_samplesize_sweep_errors(self):
+        """Should search for each model on its own when the sweep fails validation, but not hide other errors"""
+        model = LinearModel(test=Tests.UNCORRECTED, target_power=0.9)
+        with mock.patch.object(api.samplesize_sweep, 'samplesizes', side_effect=ValueError('bad')):
+            self.assertEqual([None, None], api._samplesize_sweep([model, model]))
+        with mock.patch.object(api.samplesize_sweep, 'samplesizes', side_effect=TypeError('bug')):
+            self.assertRaises(TypeError, api._samplesize_sweep, [model, model])
+
+    def test_cacheable(self):
+        """Should cache calculated results and validation errors, but not results which went wrong unexpectedly"""
+        self.assertTrue(api._cacheable(dict(power=0.8, model=dict(errors=[]))))
+        self.assertTrue(api._cacheable(dict(power='', model=dict(errors=[Constants.ERR_NO_DIFFERENCE.value]))))
+        self.assertFalse(api._cacheable(dict(power='', model=dict(errors=[[Constants.ERR_UNEXPECTED.value]]))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from app.calculation_service import executor
+
+
+def _square(x, offset=0):
+    return x * x + offset
+
+
+class ExecutorTestCase(unittest.TestCase):
+
+    def test_iter_models_serial(self):
+        """Should yield each result with the index of its model"""
+        actual = list(executor.iter_models(_square, [3, 1, 2], processes=1))
+        self.assertEqual([(0, 9), (1, 1), (2, 4)], actual)
+
+    def test_iter_models_pool(self):
+        """Should yield every result from the worker processes with the index of its model"""
+        models = list(range(50))
+        actual = dict(executor.iter_models(_square, models, processes=2, offset=1))
+        self.assertEqual({m: m * m + 1 for m in models}, actual)
+
+    def test_get_pool_threads(self):
+        """Should give threads asking for the pool at the same time the same pool"""
+        with ThreadPoolExecutor(max_workers=8) as threads:
+            pools = list(threads.map(lambda i: executor.get_pool(2), range(32)))
+        self.assertEqual(1, len(set(map(id, pools))))
+        self.assertEqual([4, 9], list(pools[0].map(_square, [2, 3])))
+
+    def test_get_processes(self):
+        """Should use one process per cpu when processes is not positive"""
+        self.assertEqual(os.cpu_count(), executor.get_processes(0))
+        self.assertEqual(3, executor.get_processes(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from app.calculation_service.jobs import Job, JobQueue, JobQueueFull, JobStore
+from app.calculation_service.model.enums import JobStatus
+
+
+class JobQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = JobStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_job(self):
+        """Should report partial results while a job is running, and all results when it has finished"""
+        queue = JobQueue(self.store, workers=1)
+        release = threading.Event()
+
+        def run(job):
+            job.add_result(1, 'b')
+            release.wait(10)
+            job.add_result(0, 'a')
+
+        job = queue.submit(run, 2)
+        while job.completed < 1:
+            release.wait(0.01)
+        self.assertEqual([None, 'b'], job.to_dict()['results'])
+        release.set()
+        self.assertTrue(job.wait(10))
+        actual = queue.get(job.id)
+        self.assertEqual(JobStatus.FINISHED.value, actual['status'])
+        self.assertEqual(2, actual['completed'])
+        self.assertEqual(['a', 'b'], actual['results'])
+
+    def test_job_of_another_process(self):
+        """Should read a job run by the queue of another process from the shared store"""
+        queue = JobQueue(self.store, workers=1)
+        job = queue.submit(lambda job: job.add_result(0, {'power': 0.8}), 1)
+        self.assertTrue(job.wait(10))
+        actual = JobQueue(JobStore(self.directory)).get(job.id)
+        self.assertEqual(JobStatus.FINISHED.value, actual['status'])
+        self.assertEqual([{'power': 0.8}], actual['results'])
+        self.assertIsNone(queue.get('0' * 32))
+        self.assertIsNone(queue.get('../' + job.id))
+
+    def test_job_of_stopped_process(self):
+        """Should report a job whose process on this host stopped before it finished as failed"""
+        job = Job(0, self.store)
+        self.store.save(job)
+        path = os.path.join(self.directory, job.id + '.json')
+        with open(path) as f:
+            status = json.load(f)
+        with open(path, 'w') as f:
+            json.dump(dict(status, pid=999999999), f)
+        actual = JobQueue(self.store).get(job.id)
+        self.assertEqual(JobStatus.FAILED.value, actual['status'])
+        self.assertEqual(0, self.store.pending())
+        with open(path, 'w') as f:
+            json.dump(dict(status, pid=999999999, host='another-host'), f)
+        self.assertEqual(JobStatus.QUEUED.value, self.store.load(job.id)['status'])
+
+    def test_failed_job(self):
+        """Should record the error of a job which raises"""
+        queue = JobQueue(self.store, workers=1)
+
+        def run(job):
+            raise ValueError('bad')
+
+        job = queue.submit(run, 1)
+        queue.shutdown(wait=True)
+        self.assertEqual(JobStatus.FAILED.value, queue.get(job.id)['status'])
+        self.assertEqual('bad', queue.get(job.id)['error'])
+
+    def test_max_jobs(self):
+        """Should drop the oldest finished jobs"""
+        queue = JobQueue(self.store, workers=1, max_jobs=2)
+        jobs = []
+        for i in range(3):
+            jobs.append(queue.submit(lambda job: None, 0))
+            jobs[-1].wait(10)
+        self.assertIsNone(queue.get(jobs[0].id))
+        self.assertIsNotNone(queue.get(jobs[2].id))
+
+    def test_max_pending(self):
+        """Should refuse jobs while the queue has its maximum number of unfinished jobs"""
+        queue = JobQueue(self.store, workers=1, max_pending=2)
+        release = threading.Event()
+        jobs = [queue.submit(lambda job: release.wait(10), 0) for i in range(2)]
+        self.assertRaises(JobQueueFull, queue.submit, lambda job: None, 0)
+        release.set()
+        for job in jobs:
+            self.assertTrue(job.wait(10))
+        self.assertIsNotNone(queue.submit(lambda job: None, 0))
+        queue.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+
+from app.calculation_service.model.enums import HypothesisType
+from app.calculation_service.model.kronecker_product import KroneckerProduct
+from app.calculation_service.model.linear_model import LinearModel
+
+
+class KroneckerProductTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.outcome = np.array([[2, 0.5], [0.5, 1]])
+        self.time = np.array([[1, 0.3, 0.1], [0.3, 1, 0.3], [0.1, 0.3, 1]])
+        self.region = np.array([[1.5, 0.2], [0.2, 1.5]])
+        self.u_time = np.array([[-1, 1], [0, -2], [1, 1]])
+        self.u_region = np.array([[1], [-1]])
+
+    def test_dense(self):
+        """Should expand nested products in order"""
+        actual = KroneckerProduct([self.outcome, KroneckerProduct([self.time, self.region]), 0.5])
+        expected = np.kron(np.kron(self.outcome, np.kron(self.time, self.region)), 0.5)
+        self.assertEqual(expected.shape, actual.shape)
+        np.testing.assert_array_almost_equal(expected, actual.dense())
+
+    def test_congruence(self):
+        """Should calculate U'AU factor by factor"""
+        a = KroneckerProduct([self.outcome, self.time, self.region, 0.5])
+        u = KroneckerProduct([np.identity(2), self.u_time, self.u_region, np.array([[1]])])
+        self.assertTrue(a.conforms(u))
+        expected = u.dense().T @ a.dense() @ u.dense()
+        np.testing.assert_array_almost_equal(expected, a.congruence(u).dense())
+
+    def test_conforms(self):
+        """Should not conform when the factor dimensions differ"""
+        a = KroneckerProduct([self.outcome, self.time])
+        u = KroneckerProduct([np.identity(3), self.u_region])
+        self.assertFalse(a.conforms(u))
+
+    def test_unadjusted_sigma_star(self):
+        """Should calculate the same sigma star from the factors as from the dense matrices"""
+        model = LinearModel()
+        model.sigma_star_outcome_component = self.outcome
+        model.sigma_star_repeated_measure_component = np.kron(self.time, self.region)
+        model.sigma_star_cluster_component = 0.5
+        model.u_matrix = np.kron(np.kron(np.identity(2), self.u_time), self.u_region)
+        expected = model.calculate_unadjusted_sigma_star(HypothesisType.POLYNOMIAL.value)
+        model.sigma_star_repeated_measure_factors = KroneckerProduct([self.time, self.region])
+        model.u_matrix_factors = KroneckerProduct([np.identity(2), self.u_time, self.u_region, np.array([[1]])])
+        actual = model.calculate_unadjusted_sigma_star(HypothesisType.POLYNOMIAL.value)
+        np.testing.assert_array_almost_equal(expected, actual)
+
+
+if __name__ == '__main__':
+    unittest.main()
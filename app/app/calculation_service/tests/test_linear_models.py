@@ -1,3 +1,5 @@
+import os
+import pickle
 import unittest
 
 import numpy as np
@@ -9,6 +11,10 @@ from app.calculation_service.model.isu_factors import IsuFactors
 from app.calculation_service.model.contrast_matrix import ContrastMatrix
 from app.calculation_service.model.enums import HypothesisType
 from app.calculation_service.model.predictor import Predictor
+from app.calculation_service.model.scenario_inputs import ScenarioInputs
+from app.calculation_service.model.study_design import StudyDesign
+from app.calculation_service.model.enums import Tests, SolveFor
+from app.constants import Constants
 
 
 class LinearModelsTestCase(unittest.TestCase):
@@ -62,9 +68,7 @@ class LinearModelsTestCase(unittest.TestCase):
         np.testing.assert_array_almost_equal(expected, actual, decimal=6)
 
     def test_calculate_design_matrix(self):
-        expected = np.sqrt(np.matrix([[2, 0, 0],
-                                      [0, 1, 0],
-                                      [0, 0, 2.5]]))
+        expected = np.sqrt([2, 1, 2.5])
 
         predictor1 = Predictor()
         predictor1.name = 'Race'
@@ -81,4 +85,194 @@ class LinearModelsTestCase(unittest.TestCase):
 
         np.testing.assert_array_almost_equal(expected, actual, decimal=6)
 
+    def test_from_study_design_precomputation(self):
+        """Should build the same model from a shared design precomputation as from the study design alone"""
+        with open(os.path.join(os.path.dirname(__file__), 'v2TestResults', 'Homework5.json')) as f:
+            study_design = StudyDesign().load_from_json(f.read())
+        inputs = ScenarioInputs(alpha=0.05, smallest_group_size=4, scale_factor=2, test=Tests.HOTELLING_LAWLEY,
+                                variance_scale_factor=3)
+        precomputation = LinearModel.precompute_design(study_design, False)
 
+        # built step by step from the study design, with dense sigma star components, as before precomputation
+        isu_factors = study_design.isu_factors
+        expected = LinearModel(full_beta=study_design.full_beta, orthonormalize_u_matrix=False)
+        expected.essence_design_matrix = expected.calculate_design_matrix(isu_factors)
+        expected.hypothesis_beta = expected.get_beta(isu_factors, inputs.scale_factor)
+        expected.c_matrix = expected.calculate_c_matrix(isu_factors)
+        expected.u_matrix = expected.calculate_u_matrix(isu_factors)
+        expected.sigma_star_outcome_component = expected.calculate_outcome_sigma_star(isu_factors,
+                                                                                      inputs.variance_scale_factor)
+        expected.sigma_star_repeated_measure_component = expected.calculate_rep_measure_sigma_star(isu_factors)
+        expected.sigma_star_cluster_component = expected.calculate_cluster_sigma_star(isu_factors)
+        expected.sigma_star_gaussian_adjustment = expected.calculate_gaussian_adjustment(study_design.gaussian_covariate)
+        expected.set_sigma_star(expected.adjust_sigma_star(
+            expected.calculate_unadjusted_sigma_star(isu_factors.uMatrix.hypothesis_type)))
+        expected.theta_zero = isu_factors.theta0
+        expected.repeated_rows_in_design_matrix = inputs.smallest_group_size
+        expected.smallest_group_size = inputs.smallest_group_size
+        expected.total_n = expected.calculate_total_n(isu_factors, inputs)
+        expected.calc_metadata()
+        actual = LinearModel()
+        actual.from_study_design(study_design, inputs, False, precomputation)
+
+        self.assertTrue(precomputation.complete)
+        self.assertIs(precomputation.c_matrix, actual.c_matrix)
+        np.testing.assert_array_almost_equal(expected.hypothesis_beta, actual.hypothesis_beta)
+        np.testing.assert_array_almost_equal(expected.sigma_star, actual.sigma_star)
+        np.testing.assert_array_almost_equal(expected.theta, actual.theta)
+        np.testing.assert_array_almost_equal(expected.m, actual.m)
+        np.testing.assert_array_almost_equal(expected.delta, actual.delta)
+        self.assertEqual(expected.total_n, actual.total_n)
+        self.assertEqual(expected.nu_e, actual.nu_e)
+        self.assertFalse(actual.errors)
+
+    def test_calc_scaled_metadata(self):
+        """Should rescale theta and delta of the design to the same values as calc_metadata calculates"""
+        with open(os.path.join(os.path.dirname(__file__), 'v2TestResults', 'Homework5.json')) as f:
+            study_design = StudyDesign().load_from_json(f.read())
+        inputs = ScenarioInputs(alpha=0.05, smallest_group_size=4, scale_factor=2, test=Tests.HOTELLING_LAWLEY,
+                                variance_scale_factor=3)
+        precomputation = LinearModel.precompute_design(study_design, False)
+        self.assertTrue(precomputation.scalable)
+        actual = LinearModel()
+        actual.from_study_design(study_design, inputs, False, precomputation)
+        expected = LinearModel()
+        expected.from_study_design(study_design, inputs, False)
+        # calculated from the scaled hypothesis beta of the model, rather than rescaled from the design
+        for fact in ['theta', 'm', 'm_factor', 'm_is_singular', 'delta', 'hypothesis_sum_square', 'nu_e',
+                     'error_sum_square']:
+            expected._facts.pop(fact, None)
+        expected.calc_metadata()
+        np.testing.assert_array_almost_equal(expected.theta, actual.theta)
+        np.testing.assert_array_almost_equal(expected.delta, actual.delta)
+        np.testing.assert_array_almost_equal(expected.hypothesis_sum_square, actual.hypothesis_sum_square)
+        np.testing.assert_array_almost_equal(expected.error_sum_square, actual.error_sum_square)
+        self.assertEqual(expected.nu_e, actual.nu_e)
+
+    def test_calculate_min_smallest_group_size(self):
+        """Should find the smallest group size which gives positive error degrees of freedom"""
+        with open(os.path.join(os.path.dirname(__file__), 'v2TestResults', 'Homework3.json')) as f:
+            study_design = StudyDesign().load_from_json(f.read())
+        study_design.solve_for = SolveFor.SAMPLESIZE
+        inputs = ScenarioInputs(alpha=0.05, target_power=0.9, smallest_group_size=1, test=Tests.HOTELLING_LAWLEY)
+        model = LinearModel()
+        model.from_study_design(study_design, inputs, False)
+        self.assertEqual(2, model.minimum_smallest_group_size)
+        self.assertEqual(6, model.total_n)
+        self.assertEqual(3, model.nu_e)
+        self.assertNotIn(Constants.ERR_ERROR_DEG_FREEDOM, model.errors)
+
+    def test_calc_m(self):
+        """Should calculate M from the diagonal of the essence design matrix as from the dense matrix"""
+        c_matrix = np.array([[1, -1, 0], [0, 1, -1]])
+        x = np.sqrt([2, 1, 2.5])
+        model = LinearModel(essence_design_matrix=x, c_matrix=c_matrix)
+        dense = np.diag(x)
+        expected = c_matrix @ np.linalg.inv(dense.T @ dense) @ c_matrix.T
+        np.testing.assert_array_almost_equal(expected, model.calc_m())
+        self.assertEqual(3, model.get_rank_essence_design_matrix())
+        np.testing.assert_array_almost_equal(dense, model.get_dense_essence_design_matrix())
+        self.assertEqual(dense.tolist(), model.to_dict()['essence_design_matrix'].tolist())
+
+    def test_calc_m_scalar_c_matrix(self):
+        """Should calculate M for a custom C of 1, with no between factors in the hypothesis, as (X'X)^-1"""
+        x = np.sqrt([2, 1, 2.5])
+        model = LinearModel(essence_design_matrix=x, c_matrix=1, hypothesis_beta=np.array([[1.0], [2.0], [4.0]]),
+                            u_matrix=np.identity(1), theta_zero=np.zeros((3, 1)))
+        expected = np.linalg.inv(np.diag([2, 1, 2.5]))
+        np.testing.assert_array_almost_equal(expected, model.calc_m())
+        np.testing.assert_array_almost_equal([[1 * 2 + 4 * 1 + 16 * 2.5]], model.delta)
+        model = LinearModel(essence_design_matrix=np.sqrt([2]), c_matrix=np.array([[1]]))
+        np.testing.assert_array_almost_equal([[0.5]], model.calc_m())
+
+    def test_collapse_relative_group_sizes(self):
+        """Should add the group sizes across the predictors which are not in the hypothesis"""
+        treatment = Predictor(name='Treatment', values=['Placebo', 'Drug'])
+        genotype = Predictor(name='Genotype', values=['A', 'B', 'C'])
+        group_sizes = np.array([[1, 2, 3], [4, 5, 6]])
+        model = LinearModel()
+        self.assertEqual([6, 15], model.collapse_relative_group_sizes([treatment], [treatment, genotype], group_sizes))
+        self.assertEqual([5, 7, 9], model.collapse_relative_group_sizes([genotype], [treatment, genotype], group_sizes))
+
+    def test_calc_delta_factorisation(self):
+        """Should calculate delta by solves with the factorisation of M, and detect a singular M"""
+        theta = np.array([[1.0, 2.0], [0.5, -1.0]])
+        for m, method in [(np.array([[2.0, 0.5], [0.5, 1.0]]), 'cholesky'),
+                          (np.array([[1.0, 2.0], [2.0, 1.0]]), 'lu')]:
+            model = LinearModel(theta_zero=np.zeros((2, 2)))
+            model.theta = theta
+            model.m = m
+            self.assertEqual(method, model.get_m_factor()[0])
+            np.testing.assert_array_almost_equal(theta.T @ np.linalg.inv(m) @ theta, model.calc_delta())
+        model.m = np.array([[1.0, 2.0], [2.0, 4.0]])
+        self.assertTrue(model.is_m_singular())
+        self.assertIsNone(model.calc_delta())
+
+    def test_cached_ranks(self):
+        """Should cache ranks until the matrix they are derived from is replaced"""
+        model = LinearModel(c_matrix=np.array([[1, -1, 0], [0, 1, -1]]))
+        self.assertEqual(2, model.get_rank_c())
+        self.assertEqual(np.linalg.matrix_rank(model.c_matrix), model.get_rank_c())
+        self.assertIn('rank_c', model._facts)
+        model.c_matrix = np.array([[1, -1, 0]])
+        self.assertNotIn('rank_c', model._facts)
+        self.assertEqual(1, model.get_rank_c())
+        np.testing.assert_array_almost_equal(np.linalg.svd(model.c_matrix, compute_uv=False),
+                                             model.get_singular_values_c())
+
+    def test_lazy_metadata(self):
+        """Should recalculate only the metadata which depends on an attribute when it is set"""
+        model = LinearModel(essence_design_matrix=np.array([1.0, 1.0, 1.0]),
+                            repeated_rows_in_design_matrix=2,
+                            hypothesis_beta=np.array([[1.0], [2.0], [4.0]]),
+                            c_matrix=np.array([[1, -1, 0], [0, 1, -1]]),
+                            u_matrix=np.array([[1]]),
+                            sigma_star=np.array([[2.0]]),
+                            theta_zero=np.array([[0], [0]]),
+                            total_n=6)
+        theta, m, delta = model.theta, model.m, model.delta
+        self.assertEqual(3, model.nu_e)
+        np.testing.assert_array_almost_equal(np.array([[6.0]]), model.error_sum_square)
+        model.total_n = 9
+        self.assertNotIn('nu_e', model._facts)
+        self.assertNotIn('error_sum_square', model._facts)
+        self.assertIs(theta, model.theta)
+        self.assertIs(m, model.m)
+        self.assertIs(delta, model.delta)
+        self.assertEqual(6, model.nu_e)
+        np.testing.assert_array_almost_equal(np.array([[12.0]]), model.error_sum_square)
+        model.hypothesis_beta = model.hypothesis_beta * 2
+        self.assertIs(m, model.m)
+        np.testing.assert_array_almost_equal(delta * 4, model.delta)
+        np.testing.assert_array_almost_equal(2 * model.delta, model.hypothesis_sum_square)
+
+    def test_failed_metadata(self):
+        """Should raise each time metadata which cannot be calculated is asked for, but still serialise the model"""
+        model = LinearModel(essence_design_matrix=np.array([1.0, 0.0]), c_matrix=np.array([[1, -1]]),
+                            hypothesis_beta=np.array([[1.0], [2.0]]), u_matrix=np.array([[1]]),
+                            theta_zero=np.array([[0]]))
+        self.assertRaises(np.linalg.LinAlgError, lambda: model.m)
+        self.assertNotIn('m', model._facts)
+        self.assertRaises(np.linalg.LinAlgError, lambda: model.delta)
+        actual = model.to_dict()
+        self.assertIsNone(actual['m'])
+        self.assertIsNone(actual['delta'])
+        self.assertEqual([[-1.0]], actual['theta'].tolist())
+        model.essence_design_matrix = np.array([1.0, 1.0])
+        np.testing.assert_array_almost_equal([[0.5]], model.delta)
+
+    def test_pickle(self):
+        """Should restore a model, and its cached facts, from a pickle"""
+        model = LinearModel(essence_design_matrix=np.array([1.0, 1.0, 1.0]),
+                            repeated_rows_in_design_matrix=2,
+                            hypothesis_beta=np.array([[1.0], [2.0], [4.0]]),
+                            c_matrix=np.array([[1, -1, 0], [0, 1, -1]]),
+                            u_matrix=np.array([[1]]),
+                            theta_zero=np.zeros((2, 1)),
+                            total_n=6)
+        model.calc_metadata()
+        self.assertFalse(hasattr(model, '__dict__'))
+        actual = pickle.loads(pickle.dumps(model))
+        self.assertEqual(model._facts.keys(), actual._facts.keys())
+        np.testing.assert_array_almost_equal(model.delta, actual.delta)
+        self.assertEqual(3, actual.nu_e)
@@ -0,0 +1,83 @@
+import json
+import os
+import unittest
+
+import numpy as np
+
+from app.calculation_service.model.enums import SolveFor, Tests
+from app.calculation_service.model.scenario_inputs import ScenarioInputs
+from app.calculation_service.model.study_design import StudyDesign
+from app.calculation_service.power_curves import PowerCurveEvaluation
+
+
+class PowerCurvesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(os.path.dirname(__file__), 'testInputs', 'Test01_V3_ConditionalTwoSampleTTest.json')) as f:
+            self.d = json.load(f)
+        self.d['_selectedTests'] = ['Uncorrected', 'Hotelling Lawley Trace']
+        self.d['_powerCurve'] = {'_xAxis': 'TotalSampleSize',
+                                 '_xAxisValues': [5, 8],
+                                 '_dataSeries': [{'_typeIerror': 0.05, '_meanScaleFactor': 1, '_varianceScaleFactor': 1},
+                                                 {'_typeIerror': 0.01, '_meanScaleFactor': 0.5, '_varianceScaleFactor': 2}]}
+
+    def load(self):
+        study_design = StudyDesign().load_from_dict(self.d)
+        return PowerCurveEvaluation(study_design, ScenarioInputs().load_from_dict(self.d, study_design.isu_factors))
+
+    def test_total_sample_size_inputs(self):
+        """Should have inputs for each point of each test and data series, at realizable total N"""
+        curve = self.load()
+        self.assertEqual(SolveFor.POWER, curve.study_design.solve_for)
+        self.assertEqual([6, 8], curve.x)
+        self.assertEqual(8, len(curve.inputs))
+        self.assertEqual([Tests.UNCORRECTED] * 4 + [Tests.HOTELLING_LAWLEY] * 4, [i.test for i in curve.inputs])
+        self.assertEqual([3, 4, 3, 4], [i.smallest_group_size for i in curve.inputs[:4]])
+        self.assertEqual([0.05, 0.05, 0.01, 0.01], [i.alpha for i in curve.inputs[:4]])
+        self.assertEqual([1, 1, 0.5, 0.5], [i.scale_factor for i in curve.inputs[:4]])
+
+    def test_desired_power_inputs(self):
+        """Should solve for samplesize at each desired power"""
+        self.d['_powerCurve']['_xAxis'] = 'DesiredPower'
+        self.d['_powerCurve']['_xAxisValues'] = [0.5, 0.9]
+        curve = self.load()
+        self.assertEqual(SolveFor.SAMPLESIZE, curve.study_design.solve_for)
+        self.assertEqual([0.5, 0.9, 0.5, 0.9], [i.target_power for i in curve.inputs[:4]])
+
+    def test_unknown_x_axis(self):
+        self.d['_powerCurve']['_xAxis'] = 'Unknown'
+        self.assertRaises(ValueError, self.load)
+
+    def test_to_dict(self):
+        """Should return one array per series, with None and an error where power was not calculated"""
+        curve = self.load()
+        results = [dict(test='Uncorrected', power=0.2, lower_bound=None, upper_bound=None, model=dict(total_n=6, errors=[])),
+                   dict(test='Uncorrected', power=-1, lower_bound=None, upper_bound=None, model=dict(total_n=8, errors=['bad']))] * 4
+        actual = curve.to_dict(results)
+        self.assertEqual('TotalSampleSize', actual['x_axis'])
+        self.assertEqual(4, len(actual['series']))
+        series = actual['series'][3]
+        self.assertEqual(Tests.HOTELLING_LAWLEY.value, series['test'])
+        self.assertEqual(0.01, series['type_I_error'])
+        self.assertEqual([0.2, None], series['power'])
+        self.assertEqual([6, 8], series['total_n'])
+        self.assertEqual([None, 'bad'], series['errors'])
+
+    def test_adaptive(self):
+        """Should refine the curve where it bends, to within the tolerance of the curve it interpolates"""
+        self.d['_powerCurve'].update(_xAxis='MeanScaleFactor', _xAxisValues=[0.1, 3], _adaptive=True, _tolerance=0.002)
+        curve = self.load()
+        f = lambda scale: 1 - np.exp(-scale ** 2)
+        calculate = lambda inputs: [dict(power=f(i.scale_factor), model=dict(total_n=6, errors=[])) for i in inputs]
+        actual = curve.evaluate(calculate)
+        self.assertEqual(0.002, actual['tolerance'])
+        self.assertLess(len(actual['x']), 64)
+        self.assertEqual(sorted(actual['x']), actual['x'])
+        x = np.linspace(0.1, 3, 1000)
+        interpolated = np.interp(x, actual['x'], actual['series'][0]['power'])
+        self.assertLess(np.max(np.abs(interpolated - f(x))), 0.01)
+        self.assertLessEqual(actual['series'][0]['interpolation_error'], 0.002)
+
+
+if __name__ == '__main__':
+    unittest.main()
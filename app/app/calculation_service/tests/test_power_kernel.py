@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+from pyglimmpse import unirep, multirep
+from pyglimmpse.exceptions.glimmpse_exception import GlimmpseValidationException
+
+from app.calculation_service import power_kernel
+
+
+class PowerKernelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sigma_star = np.array([[1, 0.3, 0.1], [0.3, 1, 0.3], [0.1, 0.3, 1]])
+        self.delta_es = np.array([[0.2, 0.1, 0], [0.1, 0.3, 0.1], [0, 0.1, 0.1]])
+        self.rep_N = [1, 2, 3, 5, 10, 50, 1000]
+        self.alpha = [0.05, 0.01, 0.05, 0.05, 0.01, 0.05, 0.05]
+        self.scales = [1, 0.5, 2, 1, 1.5, 1, 0.1]
+
+    def assertPowers(self, expected_test, actual, rank_C, sigma_stars, deltas):
+        for i, power in enumerate(actual):
+            try:
+                expected = expected_test(rank_C=rank_C, rank_X=2, relative_group_sizes=[1, 2], rep_N=self.rep_N[i],
+                                         alpha=self.alpha[i], sigma_star=np.asmatrix(sigma_stars[i]),
+                                         delta_es=np.asmatrix(deltas[i]))
+            except GlimmpseValidationException as e:
+                self.assertIsInstance(power, GlimmpseValidationException)
+                self.assertEqual(e.args, power.args)
+                continue
+            except Exception:
+                # left to pyglimmpse, so that it raises the same error
+                self.assertIsNone(power)
+                continue
+            if np.isnan(expected.power):
+                self.assertTrue(np.isnan(power.power))
+            else:
+                self.assertAlmostEqual(expected.power, power.power, places=12)
+                self.assertEqual(expected.fmethod, power.fmethod)
+
+    def test_powers(self):
+        """Should calculate the same power for each model as pyglimmpse"""
+        sigma_stars = np.stack([self.sigma_star * scale for scale in self.scales])
+        deltas = np.stack([self.delta_es * scale ** 2 for scale in self.scales])
+        for rank_C in [1, 2]:
+            for test in [unirep.uncorrected, unirep.box, unirep.geisser_greenhouse, unirep.hyuhn_feldt,
+                         multirep.special, multirep.hlt_two_moment_null_approximator_obrien_shieh,
+                         multirep.pbt_two_moment_null_approx_obrien_shieh,
+                         multirep.wlk_two_moment_null_approx_obrien_shieh]:
+                actual = power_kernel.powers(test=test, rank_C=rank_C, rank_X=2, relative_group_sizes=[1, 2],
+                                             rep_N=self.rep_N, alpha=self.alpha, sigma_star=sigma_stars,
+                                             delta_es=deltas)
+                self.assertPowers(test, actual, rank_C, sigma_stars, deltas)
+
+    def test_powers_with_sigma_star_factor(self):
+        """Should calculate the same power from the Cholesky factors of sigma star as from sigma star"""
+        sigma_stars = np.stack([self.sigma_star * scale for scale in self.scales])
+        deltas = np.stack([self.delta_es * scale ** 2 for scale in self.scales])
+        for test in [unirep.geisser_greenhouse, multirep.special, multirep.wlk_two_moment_null_approx_obrien_shieh]:
+            actual = power_kernel.powers(test=test, rank_C=2, rank_X=2, relative_group_sizes=[1, 2],
+                                         rep_N=self.rep_N, alpha=self.alpha, sigma_star=sigma_stars,
+                                         delta_es=deltas, sigma_star_factor=np.linalg.cholesky(sigma_stars))
+            self.assertPowers(test, actual, 2, sigma_stars, deltas)
+
+    def test_powers_of_several_tests(self):
+        """Should calculate power for models with different tests in one batch, sharing their spectra"""
+        tests = [unirep.geisser_greenhouse, multirep.hlt_two_moment_null_approximator_obrien_shieh,
+                 multirep.wlk_two_moment_null_approx_obrien_shieh]
+        models = [(test, i) for i in range(len(self.rep_N)) for test in tests]
+        sigma_stars = np.stack([self.sigma_star] * len(models))
+        deltas = np.stack([self.delta_es] * len(models))
+        rep_N = [self.rep_N[i] for test, i in models]
+        spectra = power_kernel.Spectra(2, [1, 2], np.asarray(rep_N, dtype=float), sigma_stars, deltas)
+        self.assertEqual(len(self.rep_N), len(spectra.rep_N))
+        actual = power_kernel.powers(test=[test for test, i in models], rank_C=2, rank_X=2,
+                                     relative_group_sizes=[1, 2], rep_N=rep_N,
+                                     alpha=[self.alpha[i] for test, i in models], sigma_star=sigma_stars,
+                                     delta_es=deltas)
+        for test in tests:
+            self.assertPowers(test, [power for (t, i), power in zip(models, actual) if t is test], 2,
+                              sigma_stars, deltas)
+
+    def test_supports(self):
+        """Should only support the tests and optional arguments it calculates power for as pyglimmpse does"""
+        self.assertTrue(power_kernel.supports(unirep.geisser_greenhouse))
+        self.assertTrue(power_kernel.supports(multirep.special, tolerance=1e-12))
+        self.assertTrue(power_kernel.supports(multirep.hlt_two_moment_null_approximator_obrien_shieh))
+        self.assertFalse(power_kernel.supports(multirep.hlt_one_moment_null_approximator))
+        self.assertFalse(power_kernel.supports(unirep.uncorrected, quantile=0.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
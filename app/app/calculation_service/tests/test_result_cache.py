@@ -0,0 +1,61 @@
+import os
+import unittest
+
+from app.calculation_service.model.scenario_inputs import ScenarioInputs
+from app.calculation_service.model.study_design import StudyDesign
+from app.calculation_service.result_cache import ResultCache
+
+
+class ResultCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.cache = ResultCache(max_size=2, ttl=10, clock=lambda: self.now)
+
+    def test_lru_eviction(self):
+        """Should evict the least recently used entry when full"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.assertEqual(1, self.cache.get('a'))
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(3, self.cache.get('c'))
+        stats = self.cache.stats()
+        self.assertEqual(3, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['evictions'])
+        self.assertEqual(2, stats['size'])
+
+    def test_ttl(self):
+        """Should not return entries older than the time to live"""
+        self.cache.set('a', 1)
+        self.now = 11
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(1, self.cache.stats()['expirations'])
+        self.assertEqual(0, self.cache.stats()['size'])
+
+    def test_disabled(self):
+        """Should store nothing when max_size is 0"""
+        cache = ResultCache(max_size=0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_fingerprint(self):
+        """Separately parsed copies of the same design should have the same fingerprint"""
+        path = os.path.join(os.path.dirname(__file__), 'v2TestResults', 'Homework5.json')
+        with open(path, 'r') as f:
+            data = f.read()
+        first = StudyDesign().load_from_json(data)
+        second = StudyDesign().load_from_json(data)
+        self.assertEqual(first.fingerprint(), second.fingerprint())
+        inputs = ScenarioInputs().load_from_json(data)
+        fingerprints = [i.fingerprint() for i in inputs]
+        self.assertEqual(fingerprints, [i.fingerprint() for i in ScenarioInputs().load_from_json(data)])
+        self.assertEqual(len(set(fingerprints)), len(fingerprints))
+        second.full_beta = not second.full_beta
+        self.assertNotEqual(first.fingerprint(), second.fingerprint())
+
+
+if __name__ == '__main__':
+    unittest.main()
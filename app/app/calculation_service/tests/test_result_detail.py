@@ -0,0 +1,59 @@
+import copy
+import unittest
+
+import numpy as np
+
+from app.calculation_service.model.enums import Detail
+from app.calculation_service.result_detail import MatrixTable, shape
+
+
+class ResultDetailTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sigma_star = [[1.0, 0.3], [0.3, 1.0]]
+        self.results = [dict(test='Uncorrected', power=0.8,
+                             model=dict(total_n=10, c_matrix=[[1, -1]], sigma_star=sigma_star, u_matrix=None)),
+                        dict(test='Uncorrected', power=0.9,
+                             model=dict(total_n=20, c_matrix=[[1, -1]], sigma_star=copy.deepcopy(sigma_star),
+                                        u_matrix=None))]
+
+    def test_full(self):
+        result = self.results[0]
+        self.assertIs(result, shape(result, Detail.FULL))
+
+    def test_lean(self):
+        """Should return the numbers of a result with only the errors and identifying inputs of its model"""
+        self.results[0]['model'].update(errors=[['bad']], alpha=0.05, quantile=0.5)
+        actual = shape(self.results[0], Detail.LEAN)
+        self.assertEqual(dict(test='Uncorrected', power=0.8,
+                              model=dict(total_n=10, errors=[['bad']], alpha=0.05, quantile=0.5)), actual)
+        self.assertIn('sigma_star', self.results[0]['model'])
+
+    def test_shared(self):
+        """Should refer to each distinct matrix by its id, without changing the results"""
+        expected = copy.deepcopy(self.results)
+        table = MatrixTable()
+        actual = [shape(result, Detail.SHARED, table) for result in self.results]
+        self.assertEqual([[[1, -1]], [[1.0, 0.3], [0.3, 1.0]]], table.matrices)
+        self.assertEqual(dict(total_n=20, c_matrix=0, sigma_star=1, u_matrix=None), actual[1]['model'])
+        self.assertEqual(actual[0]['model']['sigma_star'], actual[1]['model']['sigma_star'])
+        self.assertEqual(expected, self.results)
+
+    def test_shared_arrays(self):
+        """Should compare arrays by their contents, whatever their memory layout"""
+        table = MatrixTable()
+        matrix = np.arange(6.0).reshape(2, 3)
+        self.assertEqual(0, table.add(matrix))
+        self.assertEqual(0, table.add(np.asfortranarray(matrix)))
+        self.assertEqual(1, table.add(matrix.T))
+        self.assertEqual(2, table.add(matrix.astype(int)))
+        self.assertEqual(3, table.add(matrix.tolist()))
+        self.assertEqual(3, table.add(matrix.tolist()))
+
+    def test_not_calculated(self):
+        """Should return results without a model, such as those of a job not yet calculated, as they are"""
+        self.assertIsNone(shape(None, Detail.SHARED, MatrixTable()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from app.calculation_service import result_encoder
+
+
+class ResultEncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.result = dict(test='Uncorrected',
+                           power=np.float64(0.8),
+                           model=dict(total_n=10,
+                                      sigma_star=np.array(np.matrix([[1.0, 0.3], [0.3, float('nan')]]), order='C'),
+                                      theta=np.arange(6.0).reshape(2, 3).T,
+                                      essence_design_matrix=np.array([1.0, float('inf')]),
+                                      cluster=np.array([[None]]),
+                                      groups=[1, 2]))
+        self.expected = dict(test='Uncorrected',
+                             power=0.8,
+                             model=dict(total_n=10,
+                                        sigma_star=[[1.0, 0.3], [0.3, None]],
+                                        theta=[[0.0, 3.0], [1.0, 4.0], [2.0, 5.0]],
+                                        essence_design_matrix=[1.0, None],
+                                        cluster=[[None]],
+                                        groups=[1, 2]))
+
+    def test_dumps(self):
+        """Should write arrays as nested lists, with null for their non-finite entries"""
+        self.assertEqual(self.expected, json.loads(result_encoder.dumps(self.result).decode('utf-8')))
+
+    def test_dumps_without_orjson(self):
+        """Should write the same JSON with json when orjson is not installed"""
+        with mock.patch.object(result_encoder, 'orjson', None):
+            self.assertEqual(self.expected, json.loads(result_encoder.dumps(self.result).decode('utf-8')))
+
+    def test_finite(self):
+        self.assertEqual(result_encoder.NOT_A_NUMBER, result_encoder.finite(float('nan')))
+        self.assertEqual(result_encoder.NOT_A_NUMBER, result_encoder.finite(np.float64('inf')))
+        self.assertEqual(0.5, result_encoder.finite(0.5))
+        self.assertEqual('Not Calculated.', result_encoder.finite('Not Calculated.'))
+
+
+if __name__ == '__main__':
+    unittest.main()
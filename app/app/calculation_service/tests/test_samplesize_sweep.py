@@ -0,0 +1,44 @@
+import unittest
+
+import numpy as np
+from pyglimmpse import samplesize, unirep, multirep
+
+from app.calculation_service import samplesize_sweep
+
+
+class SamplesizeSweepTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.args = dict(rank_C=1,
+                         rank_X=2,
+                         relative_group_sizes=[1, 2],
+                         alpha=0.05,
+                         sigma_star=np.matrix([[1, 0.3], [0.3, 1]]),
+                         delta_es=np.matrix([[0.2, 0.1], [0.1, 0.3]]))
+        self.targets = [0.8, 0.85, 0.9, 0.95]
+
+    def test_samplesizes(self):
+        """Should find the same samplesize and power for each target as pyglimmpse"""
+        for test in [unirep.uncorrected, unirep.geisser_greenhouse, multirep.special]:
+            actual = samplesize_sweep.samplesizes(test=test, target_powers=self.targets, tolerance=1e-12,
+                                                  **self.args)
+            for target, (size, power) in zip(self.targets, actual):
+                expected_size, expected_power = samplesize.samplesize(test=test, targetPower=target,
+                                                                      tolerance=1e-12, **self.args)
+                self.assertEqual(expected_size, size)
+                self.assertAlmostEqual(expected_power.power, power.power, places=12)
+
+    def test_power_evaluated_once(self):
+        """Should evaluate power at most once for each N"""
+        calls = []
+
+        def test(**kwargs):
+            calls.append((kwargs['rep_N'], 'tolerance' in kwargs))
+            return unirep.uncorrected(**kwargs)
+
+        samplesize_sweep.samplesizes(test=test, target_powers=self.targets, tolerance=1e-12, **self.args)
+        self.assertEqual(len(set(calls)), len(calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from app.calculation_service.model.confidence_interval import ConfidenceInterval
+from app.calculation_service.model.enums import Tests
+from app.calculation_service.model.scenario_inputs import ScenarioInputs
+
+
+class ScenarioInputsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.d = {'_solveFor': 'SAMPLESIZE',
+                  '_power': [0.8, 0.9],
+                  '_typeOneErrorRate': [0.05],
+                  '_selectedTests': ['Hotelling Lawley Trace'],
+                  '_gaussianCovariate': {'standard_deviation': 1, 'power_method': ['unconditional', 'quantile']},
+                  '_quantiles': [0.25, 0.5],
+                  '_confidence_interval': {'beta_known': False, 'rank_est': 2, 'n_est': 20}}
+
+    def test_decode_samplesize(self):
+        """Should decode the power method, quantile and confidence interval of every samplesize combination"""
+        actual = ScenarioInputs().load_from_dict(self.d)
+        self.assertEqual(8, len(actual))
+        self.assertEqual(['unconditional', 'unconditional', 'quantile', 'quantile'],
+                         [i.power_method for i in actual[:4]])
+        self.assertEqual([None, None, 0.25, 0.5], [i.quantile for i in actual[:4]])
+        self.assertIsInstance(actual[0].confidence_interval, ConfidenceInterval)
+        self.assertEqual(20, actual[0].confidence_interval.n_est)
+
+    def test_grid(self):
+        """Should generate the same inputs as the decoded list, in the same order, without holding them"""
+        grid = ScenarioInputs().grid_from_dict(self.d)
+        self.assertEqual(8, len(grid))
+        self.assertEqual([Tests.HOTELLING_LAWLEY], grid.tests)
+        expected = ScenarioInputs().load_from_dict(self.d)
+        self.assertEqual([i.fingerprint() for i in expected], [i.fingerprint() for i in grid])
+        self.assertIsNot(next(iter(grid)), next(iter(grid)))
+
+    def test_normalised(self):
+        """Should only keep the quantile and power method where they change the calculation"""
+        inputs = ScenarioInputs(alpha=0.05, test=Tests.UNCORRECTED, power_method='quantile', quantile=0.5)
+        self.assertEqual(('quantile', 0.5), (inputs.power_method, inputs.quantile))
+        normalised = inputs.normalised(gaussian_covariate=False)
+        self.assertEqual(('conditional', None), (normalised.power_method, normalised.quantile))
+        self.assertEqual(ScenarioInputs(alpha=0.05, test=Tests.UNCORRECTED).normalised(False).fingerprint(),
+                         normalised.fingerprint())
+        normalised = inputs.normalised(gaussian_covariate=True)
+        self.assertEqual(('quantile', 0.5), (normalised.power_method, normalised.quantile))
+        normalised = ScenarioInputs(alpha=0.05, test=Tests.UNCORRECTED).normalised(gaussian_covariate=True)
+        self.assertEqual(('unconditional', None), (normalised.power_method, normalised.quantile))
+        self.assertEqual(0.5, inputs.quantile)
+
+
+if __name__ == '__main__':
+    unittest.main()
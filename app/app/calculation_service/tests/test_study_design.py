@@ -1,3 +1,4 @@
+import json
 import unittest
 import numpy as np
 from pyglimmpse import unirep, multirep
@@ -13,6 +14,7 @@ from app.calculation_service.model.repeated_measure import RepeatedMeasure
 from app.calculation_service.model.study_design import StudyDesign
 from app.calculation_service.models import Matrix
 from pyglimmpse.constants import Constants
+from pyglimmpse.exceptions.glimmpse_exception import GlimmpseValidationException
 
 from app.calculation_service.model.scenario_inputs import ScenarioInputs
 from app.calculation_service.model.contrast_matrix import ContrastMatrix
@@ -202,6 +204,43 @@ class StudyDesignTestCase(unittest.TestCase):
         self.assertEqual(actual.fmethod, Constants.FMETHOD_MISSING)
         self.assertEqual(actual.error_message, 'Power is missing because df2 or eval_HINVE is not valid.')
 
+    def test_load_from_dict(self):
+        """Should decode the study design and inputs from one parsed request, sharing the IsuFactors"""
+        with open("v2TestResults/Homework5.json") as f:
+            data = f.read()
+        d = json.loads(data)
+        actual = StudyDesign().load_from_dict(d)
+        inputs = ScenarioInputs().load_from_dict(d, actual.isu_factors)
+        self.assertEqual(StudyDesign().load_from_json(data).fingerprint(), actual.fingerprint())
+        self.assertEqual([i.fingerprint() for i in ScenarioInputs().load_from_json(data)],
+                         [i.fingerprint() for i in inputs])
+
+    def test_load_compact_tables(self):
+        """Should build the same BETA and groups from the compact array format as from the tables of cells"""
+        with open("v2TestResults/Homework5.json") as f:
+            d = json.load(f)
+        expected = StudyDesign().load_from_dict(d)
+        model = LinearModel()
+        expected_beta = model.get_beta(expected.isu_factors)
+        expected_groups = model.get_groups(expected.isu_factors)
+
+        isu_factors = d['_isuFactors']
+        isu_factors['marginalMeansArray'] = dict(rows=['Treatment', 'Genotype'],
+                                                 columns=['Brain Region'],
+                                                 values=expected_beta.tolist())
+        isu_factors['betweenIsuRelativeGroupSizesArray'] = dict(axes=['Treatment', 'Genotype'],
+                                                               values=np.reshape(expected_groups, (2, 4)).tolist())
+        del isu_factors['marginalMeans']
+        del isu_factors['betweenIsuRelativeGroupSizes']
+        actual = StudyDesign().load_from_dict(d)
+
+        np.testing.assert_array_equal(expected_beta, model.get_beta(actual.isu_factors))
+        self.assertEqual(expected_groups, model.get_groups(actual.isu_factors))
+
+        isu_factors['betweenIsuRelativeGroupSizesArray']['values'] = [1, 2]
+        with self.assertRaises(GlimmpseValidationException):
+            StudyDesign().load_from_dict(d)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,3 +1,7 @@
+import hashlib
+import json
+from enum import Enum
+
 import numpy as np
 
 
@@ -17,10 +21,46 @@ def kronecker_list(l: []):
         prod = np.kron(prod, l.pop())
     return prod
 
+def singular_values(m):
+    """
+    The singular values of a matrix, in descending order, or None if m is None or a scalar.
+
+    A vector is taken to be the diagonal of a diagonal matrix.
+    """
+    if m is None or np.ndim(m) == 0:
+        return None
+    if np.ndim(m) == 1:
+        return np.sort(np.abs(m))[::-1]
+    return np.linalg.svd(np.asarray(m), compute_uv=False)
+
+def rank(m, s=None):
+    """
+    Rank of a matrix, with the same tolerance as np.linalg.matrix_rank.
+
+    :param m: the matrix
+    :param s: the singular values of m, if they are already known
+    """
+    if s is None:
+        return np.linalg.matrix_rank(m)
+    if s.size == 0:
+        return 0
+    # a vector is the diagonal of a square matrix
+    tol = s.max() * max(np.shape(m)) * np.finfo(s.dtype).eps
+    return int(np.count_nonzero(s > tol))
+
+def as_matrix(m):
+    """m as an np.matrix, or None. pyglimmpse multiplies matrices with *, so takes np.matrix rather than ndarray."""
+    if m is None:
+        return None
+    return np.asmatrix(m)
+
 def serialise_matrix(m):
-    if isinstance(m, np.matrix):
-        ret = m.tolist()
-        return ret
+    """
+    A copy of m as a C ordered ndarray, or None if m is not an array. The result encoder writes it without
+    converting it to lists.
+    """
+    if isinstance(m, np.ndarray):
+        return np.array(m, order='C')
     else:
         return None
 
@@ -34,4 +74,33 @@ def print_err(err):
         e = err.value
     if hasattr(err, 'args'):
         e = [arg for arg in err.args]
-    return e
\ No newline at end of file
+    return e
+
+
+def fingerprint(*objects) -> str:
+    """
+    Content address for a set of parsed objects: the sha256 of a canonical JSON representation of them.
+
+    Objects are compared by value, so two separately parsed but identical designs have the same fingerprint.
+    """
+    canonical = json.dumps([_canonical(o) for o in objects], sort_keys=True, separators=(',', ':'), default=repr)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def _canonical(obj):
+    if isinstance(obj, Enum):
+        return _canonical(obj.value)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, dict):
+        return {str(k): _canonical(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(v) for v in obj]
+    if isinstance(obj, (set, frozenset)):
+        return sorted([_canonical(v) for v in obj], key=repr)
+    if hasattr(obj, '__dict__'):
+        d = {k: _canonical(v) for k, v in vars(obj).items()}
+        d['__class__'] = type(obj).__name__
+        return d
+    return obj
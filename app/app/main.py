@@ -1,3 +1,5 @@
+import os
+
 import sentry_sdk
 from flask import Flask
 from sentry_sdk.integrations.flask import FlaskIntegration
@@ -18,6 +20,22 @@ sentry_sdk.init(
 )
 
 app = Flask(__name__)
+# number of worker processes used to evaluate the models in a request. 1 evaluates serially, 0 uses one per CPU.
+app.config['CALCULATION_PROCESSES'] = int(os.environ.get('CALCULATION_PROCESSES', 1))
+# the inputs of a request are expanded and evaluated CALCULATION_CHUNK_SIZE at a time, bounding the models held at once.
+app.config['CALCULATION_CHUNK_SIZE'] = int(os.environ.get('CALCULATION_CHUNK_SIZE', 256))
+# calculated results are cached by design and inputs. RESULT_CACHE_SIZE=0 disables the cache.
+app.config['RESULT_CACHE_SIZE'] = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+app.config['RESULT_CACHE_TTL'] = float(os.environ.get('RESULT_CACHE_TTL', 3600))
+# the last REQUEST_RESULTS_SIZE results of a request are kept while it is calculated, so repeated inputs are calculated once.
+app.config['REQUEST_RESULTS_SIZE'] = int(os.environ.get('REQUEST_RESULTS_SIZE', 1024))
+# jobs submitted to /api/jobs are run by JOB_WORKERS threads of each process. The most recent JOB_MAX_JOBS jobs are kept,
+# and new jobs are refused while JOB_MAX_PENDING are queued or running. Jobs are kept in JOB_DIRECTORY, which every
+# process serving requests must share. By default it is in the temporary directory.
+app.config['JOB_DIRECTORY'] = os.environ.get('JOB_DIRECTORY')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))
+app.config['JOB_MAX_JOBS'] = int(os.environ.get('JOB_MAX_JOBS', 256))
+app.config['JOB_MAX_PENDING'] = int(os.environ.get('JOB_MAX_PENDING', 64))
 app.register_blueprint(api.bp)
 client = MongoClient('localhost', 27017)
 db = client['test-database']